@@ -1,23 +1,48 @@
 import aiohttp
 import asyncio
+import base64
+import json
+import logging
 from datetime import datetime, timedelta
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REQUESTS = REGISTRY.counter(
+    "lldap_token_requests_total", "LLDAP logins and JWT refreshes by kind and outcome.", ["kind", "outcome"]
+)
+TOKEN_EXPIRY = REGISTRY.gauge("lldap_token_expiry_timestamp_seconds", "Unix time at which the current LLDAP JWT expires.")
 
 class AuthManager:
     """Handles LLDAP authentication and token management."""
     
-    def __init__(self, login_url, username, password):
+    def __init__(self, login_url, username, password, renew_before_seconds=300):
         self.login_url = login_url
         self.username = username
         self.password = password
+        self.renew_before = timedelta(seconds=renew_before_seconds)
         self.jwt_token = None
         self.refresh_token = None
         self.jwt_expiry = None
         self.session = None
+        self.refresh_task = None  # The in-flight refresh shared by all concurrent callers
+        self.renewal_task = None
 
     async def initialize(self):
-        """Initializes the aiohttp session and authenticates."""
+        """Initializes the aiohttp session, authenticates and starts proactive token renewal."""
         self.session = aiohttp.ClientSession()
         await self.authenticate()
+        self.renewal_task = asyncio.create_task(self.renew_periodically())
+
+    @staticmethod
+    def token_expiry(token):
+        """Reads the expiry from a JWT's `exp` claim, falling back to one day from now if it can't be decoded."""
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)  # Restore the base64 padding JWTs strip
+            return datetime.fromtimestamp(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+        except Exception:
+            return datetime.now() + timedelta(days=1)
 
     async def authenticate(self):
         """Authenticates with LLDAP and obtains JWT and refresh tokens."""
@@ -30,13 +55,29 @@ class AuthManager:
                 data = await response.json()
                 self.jwt_token = data["token"]
                 self.refresh_token = data["refreshToken"]
-                self.jwt_expiry = datetime.now() + timedelta(days=1)  # JWT valid for 1 day
-                print("✅ Successfully authenticated with LLDAP.")
+                self.jwt_expiry = self.token_expiry(self.jwt_token)
+                TOKEN_REQUESTS.inc("login", "ok")
+                TOKEN_EXPIRY.set(self.jwt_expiry.timestamp())
+                logger.info("✅ Successfully authenticated with LLDAP.")
         except Exception as e:
-            print(f"❌ Authentication error: {e}")
+            TOKEN_REQUESTS.inc("login", "error")
+            logger.error(f"❌ Authentication error: {e}")
             raise
 
-    async def refresh(self):
+    async def refresh(self, failed_token=None):
+        """Refreshes the JWT token, sharing a single in-flight refresh between concurrent callers.
+
+        Pass the token a request was rejected with as `failed_token`; if it has already been
+        replaced, no new refresh is started.
+        """
+        if failed_token is not None and failed_token != self.jwt_token:
+            return
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._refresh())
+        # Shield so that a cancelled caller doesn't cancel the refresh the others are waiting on
+        await asyncio.shield(self.refresh_task)
+
+    async def _refresh(self):
         """Refreshes the JWT token using the refresh token."""
         url = f"{self.login_url}/auth/refresh"
         headers = {"Authorization": f"Bearer {self.refresh_token}"}
@@ -46,10 +87,13 @@ class AuthManager:
                     raise Exception(f"Token refresh failed: {response.status} {await response.text()}")
                 data = await response.json()
                 self.jwt_token = data["token"]
-                self.jwt_expiry = datetime.now() + timedelta(days=1)
-                print("✅ Successfully refreshed JWT token.")
+                self.jwt_expiry = self.token_expiry(self.jwt_token)
+                TOKEN_REQUESTS.inc("refresh", "ok")
+                TOKEN_EXPIRY.set(self.jwt_expiry.timestamp())
+                logger.info("✅ Successfully refreshed JWT token.")
         except Exception as e:
-            print(f"❌ Token refresh error: {e}")
+            TOKEN_REQUESTS.inc("refresh", "error")
+            logger.error(f"❌ Token refresh error: {e}")
             await self.authenticate()  # Re-authenticate if refresh fails
 
     async def get_jwt_token(self):
@@ -58,7 +102,22 @@ class AuthManager:
             await self.refresh()
         return self.jwt_token
 
+    async def renew_periodically(self):
+        """Background task that refreshes the JWT shortly before it expires, so requests never wait on a refresh."""
+        while True:
+            remaining = (self.jwt_expiry - datetime.now()).total_seconds()
+            # Renew `renew_before` ahead of expiry, or halfway through the lifetime of short-lived tokens
+            margin = min(self.renew_before.total_seconds(), remaining / 2)
+            await asyncio.sleep(max(remaining - margin, 5))
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Proactive token renewal failed: {e}")
+                await asyncio.sleep(30)
+
     async def close(self):
-        """Closes the aiohttp session."""
+        """Stops token renewal and closes the aiohttp session."""
+        if self.renewal_task:
+            self.renewal_task.cancel()
         if self.session:
             await self.session.close()
\ No newline at end of file
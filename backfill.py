@@ -0,0 +1,351 @@
+"""Bulk backfill: links and provisions LLDAP accounts for existing Discord role holders.
+
+Reads a CSV (with a header row) or JSONL file of discord_id, email and username, plus an optional
+groups column ("4;5") overriding --group. Rows are validated against LLDAP with one bulk users
+query, then accounts are created in batches with bounded concurrency. Existing accounts with a
+matching email but no Discord ID are linked instead. Generated credentials are appended to the
+output CSV as they are created, and every finished row is recorded in a checkpoint file so an
+interrupted run can simply be restarted. Accounts whose password or group memberships could not
+be set are recorded as needing repair, and a later run sets only what is missing.
+
+Usage: python backfill.py members.csv --group 4 [--output credentials.csv] [--dry-run]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from environment_config import EnvironmentConfig
+from auth_manager import AuthManager
+from circuit_breaker import CircuitBreaker
+from graphql_client import GraphQLClient
+from ldap_manager import LDAPManager
+from user_manager import UserManager
+from mutation_executor import MutationExecutor
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FIELDS = ["discord_id", "username", "email", "status", "temp_password"]
+
+
+def read_rows(path):
+    """Reads backfill rows from a CSV or JSONL file as dicts."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+class Backfill:
+    """Validates backfill rows against LLDAP and creates or links their accounts in batches."""
+
+    def __init__(self, user_manager, output_path, checkpoint_path, group_ids, batch_size=50, concurrency=4):
+        self.user_manager = user_manager
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.group_ids = group_ids
+        self.batch_size = batch_size
+        self.executor = MutationExecutor(concurrency)
+        self.counts = {}
+        self.output = None
+        self.output_writer = None
+        self.checkpoint = None
+
+    def load_checkpoint(self):
+        """Returns (finished, repairs) from earlier runs.
+
+        `finished` holds the Discord IDs of rows that are done; `repairs` maps the Discord IDs of
+        accounts that exist but are incomplete to (needs_password, group IDs still to add). Each
+        checkpoint line is a Discord ID, followed for incomplete accounts by a tab, "password" or
+        nothing, another tab and the missing group IDs ("4;5"). The last line for an ID wins.
+        """
+        finished, repairs = set(), {}
+        if not os.path.exists(self.checkpoint_path):
+            return finished, repairs
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            for line in f:
+                discord_id, *repair = line.rstrip("\n").split("\t")
+                if not discord_id:
+                    continue
+                if repair:
+                    needs_password, group_ids = repair[0] == "password", repair[1] if len(repair) > 1 else ""
+                    repairs[discord_id] = (needs_password, {int(group_id) for group_id in group_ids.split(";") if group_id})
+                    finished.discard(discord_id)
+                else:
+                    finished.add(discord_id)
+                    repairs.pop(discord_id, None)
+        return finished, repairs
+
+    def record(self, row, status, temp_password="", needs_password=False, failed_group_ids=()):
+        """Streams one row to the output file and records it in the checkpoint.
+
+        A row with `needs_password` or `failed_group_ids` is checkpointed as needing repair rather than finished.
+        """
+        self.counts[status] = self.counts.get(status, 0) + 1
+        self.output_writer.writerow({
+            "discord_id": row["discord_id"], "username": row["username"], "email": row["email"],
+            "status": status, "temp_password": temp_password
+        })
+        self.output.flush()
+        self.write_checkpoint(row, needs_password, failed_group_ids)
+
+    def write_checkpoint(self, row, needs_password=False, missing_group_ids=()):
+        """Records a row in the checkpoint as finished, or as needing repair if anything is missing."""
+        if needs_password or missing_group_ids:
+            groups = ";".join(str(group_id) for group_id in sorted(missing_group_ids))
+            self.checkpoint.write(f"{row['discord_id']}\t{'password' if needs_password else ''}\t{groups}\n")
+        else:
+            self.checkpoint.write(f"{row['discord_id']}\n")
+        self.checkpoint.flush()
+
+    def open_output(self):
+        """Opens the credentials CSV for appending, readable by the owner only since it holds temporary passwords."""
+        new_output = not os.path.exists(self.output_path)
+        fd = os.open(self.output_path, os.O_CREAT | os.O_APPEND | os.O_WRONLY, 0o600)
+        return open(fd, "a", encoding="utf-8", newline=""), new_output
+
+    def row_group_ids(self, row):
+        groups = str(row.get("groups") or "").strip()
+        return {int(group_id) for group_id in groups.split(";") if group_id.strip()} if groups else set(self.group_ids)
+
+    async def plan(self, rows, finished, repairs=None):
+        """Sorts rows into accounts to create, accounts to link, accounts to repair and rows to skip.
+
+        Returns (to_create, to_link, to_repair, skipped); to_link holds (row, lldap_user_id), to_repair
+        (row, lldap_user_id, needs_password, group IDs) and skipped (row, reason).
+        """
+        repairs = repairs or {}
+        users = await self.user_manager.list_user_identities()
+        by_discord_id = {discord_id: user_id for user_id, _, discord_id in users if discord_id}
+        by_email = {email.lower(): (user_id, discord_id) for user_id, email, discord_id in users if email}
+        taken_usernames = {user_id.lower() for user_id, _, _ in users}
+
+        to_create, to_link, to_repair, skipped = [], [], [], []
+        seen_discord_ids, seen_emails = set(), set()
+        for row in rows:
+            row = {key: str(row.get(key) or "").strip() for key in ("discord_id", "email", "username", "groups")}
+            row["email"] = row["email"].lower()
+            discord_id, email, username = row["discord_id"], row["email"], row["username"]
+            if discord_id in finished:
+                continue
+            if discord_id in repairs and discord_id in by_discord_id:
+                # Created or linked by an earlier run, but its password or groups are still missing
+                to_repair.append((row, by_discord_id[discord_id], *repairs[discord_id]))
+                seen_discord_ids.add(discord_id)
+                seen_emails.add(email)
+                continue
+            if not discord_id.isdigit() or "@" not in email:
+                skipped.append((row, "invalid"))
+            elif discord_id in seen_discord_ids or email in seen_emails:
+                skipped.append((row, "duplicate_in_file"))
+            elif discord_id in by_discord_id:
+                skipped.append((row, "already_linked"))
+            elif email in by_email:
+                user_id, linked_discord_id = by_email[email]
+                if linked_discord_id:
+                    skipped.append((row, "email_in_use"))
+                else:
+                    to_link.append((row, user_id))
+            elif not username.isalnum() or len(username) > 20:
+                skipped.append((row, "invalid_username"))
+            elif username.lower() in taken_usernames:
+                skipped.append((row, "username_in_use"))
+            else:
+                to_create.append(row)
+                taken_usernames.add(username.lower())
+            seen_discord_ids.add(discord_id)
+            seen_emails.add(email)
+        return to_create, to_link, to_repair, skipped
+
+    def failed_group_ids(self, group_changes, group_outcomes, ignore_existing=False):
+        """Returns LLDAP user ID -> IDs of the groups that user could not be added to.
+
+        With `ignore_existing`, adds rejected because the user is already a member count as done.
+        """
+        failed = {}
+        for (_, user_id, group_id), outcome in zip(group_changes, group_outcomes):
+            if isinstance(outcome, Exception) and not (ignore_existing and "UNIQUE constraint failed" in str(outcome)):
+                failed.setdefault(user_id, set()).add(group_id)
+        return failed
+
+    async def create_chunk(self, rows):
+        """Creates one batch of accounts, then sets their passwords and group memberships concurrently."""
+        outcomes = await self.user_manager.create_users_batch(
+            [(row["username"], row["email"], row["discord_id"]) for row in rows], self.batch_size
+        )
+        created = []
+        for row, outcome in zip(rows, outcomes):
+            if isinstance(outcome, Exception):
+                # A failed field can leave the rest of the batch unconfirmed, so check what actually exists
+                user_id = await self.user_manager.get_user_by_discord_id(row["discord_id"])
+                if not user_id:
+                    logger.error(f"❌ Failed to create {row['username']} ({row['discord_id']}): {outcome}")
+                    self.counts["failed"] = self.counts.get("failed", 0) + 1
+                    continue
+                outcome = user_id
+            created.append((row, outcome, self.user_manager.generate_temp_password()))
+            # Until the password and groups are set, a rerun after an interruption must repair the account
+            self.write_checkpoint(row, needs_password=True, missing_group_ids=self.row_group_ids(row))
+
+        group_changes = [
+            ("add", user_id, group_id) for row, user_id, _ in created for group_id in sorted(self.row_group_ids(row))
+        ]
+        password_results, group_outcomes = await asyncio.gather(
+            asyncio.gather(*(
+                self.user_manager.ldap_manager.set_password(f"uid={user_id},ou=people,{self.user_manager.ldap_base_dn}", password)
+                for _, user_id, password in created
+            )),
+            self.user_manager.apply_group_changes(group_changes, self.batch_size),
+        )
+        failed_groups = self.failed_group_ids(group_changes, group_outcomes)
+        for (row, user_id, password), password_set in zip(created, password_results):
+            missing_groups = failed_groups.get(user_id, ())
+            if not password_set:
+                self.record(row, "created_password_failed", needs_password=True, failed_group_ids=missing_groups)
+            elif missing_groups:
+                self.record(row, "created_groups_failed", password, failed_group_ids=missing_groups)
+            else:
+                self.record(row, "created", password)
+
+    async def link_chunk(self, links):
+        """Links one batch of existing accounts to their Discord IDs and adds them to their groups."""
+        outcomes = await self.user_manager.link_discord_ids(
+            [(user_id, row["discord_id"]) for row, user_id in links], self.batch_size
+        )
+        linked = []
+        for (row, user_id), outcome in zip(links, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"❌ Failed to link {user_id} to {row['discord_id']}: {outcome}")
+                self.counts["failed"] = self.counts.get("failed", 0) + 1
+            else:
+                linked.append((row, user_id))
+                self.write_checkpoint(row, missing_group_ids=self.row_group_ids(row))
+        group_changes = [("add", user_id, group_id) for row, user_id in linked for group_id in sorted(self.row_group_ids(row))]
+        group_outcomes = await self.user_manager.apply_group_changes(group_changes, self.batch_size)
+        failed_groups = self.failed_group_ids(group_changes, group_outcomes)
+        for row, user_id in linked:
+            missing_groups = failed_groups.get(user_id, ())
+            self.record(row, "linked_groups_failed" if missing_groups else "linked", failed_group_ids=missing_groups)
+
+    async def repair_chunk(self, repairs):
+        """Sets the missing passwords and group memberships of accounts left incomplete by an earlier run.
+
+        A run interrupted mid-batch may already have added some of the groups, so those adds can be rejected as duplicates.
+        """
+        needs_password = [(row, user_id, self.user_manager.generate_temp_password()) for row, user_id, missing, _ in repairs if missing]
+        group_changes = [("add", user_id, group_id) for _, user_id, _, group_ids in repairs for group_id in sorted(group_ids)]
+        password_results, group_outcomes = await asyncio.gather(
+            asyncio.gather(*(
+                self.user_manager.ldap_manager.set_password(f"uid={user_id},ou=people,{self.user_manager.ldap_base_dn}", password)
+                for _, user_id, password in needs_password
+            )),
+            self.user_manager.apply_group_changes(group_changes, self.batch_size),
+        )
+        passwords = {user_id: password if password_set else None
+                     for (_, user_id, password), password_set in zip(needs_password, password_results)}
+        failed_groups = self.failed_group_ids(group_changes, group_outcomes, ignore_existing=True)
+        for row, user_id, _, _ in repairs:
+            password = passwords.get(user_id, "")
+            missing_groups = failed_groups.get(user_id, ())
+            if password is None or missing_groups:
+                self.record(row, "repair_failed", password or "", needs_password=password is None, failed_group_ids=missing_groups)
+            else:
+                self.record(row, "repaired", password)
+
+    async def run(self, rows, dry_run=False):
+        finished, repairs = self.load_checkpoint()
+        if finished or repairs:
+            logger.info(f"⏩ Resuming: {len(finished)} rows were finished by an earlier run, {len(repairs)} need repair.")
+        to_create, to_link, to_repair, skipped = await self.plan(rows, finished, repairs)
+        logger.info(f"📋 {len(to_create)} accounts to create, {len(to_link)} to link, {len(to_repair)} to repair, "
+                    f"{len(skipped)} skipped.")
+        if dry_run:
+            for row, reason in skipped:
+                logger.info(f"⏭️ {row['discord_id']} ({row['email']}): {reason}")
+            return
+
+        self.output, new_output = self.open_output()
+        with self.output, open(self.checkpoint_path, "a", encoding="utf-8") as self.checkpoint:
+            self.output_writer = csv.DictWriter(self.output, fieldnames=OUTPUT_FIELDS)
+            if new_output:
+                self.output_writer.writeheader()
+            for row, reason in skipped:
+                self.record(row, reason)
+
+            started = time.monotonic()
+            operations = [
+                (f"create {start}", self.create_chunk, (to_create[start:start + self.batch_size],))
+                for start in range(0, len(to_create), self.batch_size)
+            ] + [
+                (f"link {start}", self.link_chunk, (to_link[start:start + self.batch_size],))
+                for start in range(0, len(to_link), self.batch_size)
+            ] + [
+                (f"repair {start}", self.repair_chunk, (to_repair[start:start + self.batch_size],))
+                for start in range(0, len(to_repair), self.batch_size)
+            ]
+            report = await self.executor.run(operations)
+            duration = time.monotonic() - started
+
+        done = len(to_create) + len(to_link) + len(to_repair)
+        rate = done / duration if duration > 0 else 0.0
+        logger.info(f"✅ Backfill finished in {duration:.1f}s ({rate:.0f} users/s): "
+                    + ", ".join(f"{status}={count}" for status, count in sorted(self.counts.items())))
+        if report.failed:
+            logger.error(f"❌ {len(report.failed)} batches failed outright; re-run to retry them.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create or link LLDAP accounts for existing Discord role holders.")
+    parser.add_argument("input", help="CSV (with header) or .jsonl file of discord_id, email, username[, groups]")
+    parser.add_argument("--group", type=int, action="append", default=[], help="LLDAP group ID to add every account to (repeatable)")
+    parser.add_argument("--output", default="backfill_credentials.csv", help="CSV file generated credentials are appended to")
+    parser.add_argument("--checkpoint", help="Checkpoint file (defaults to <input>.checkpoint)")
+    parser.add_argument("--batch-size", type=int, help="Accounts per batched GraphQL request (defaults to SYNC_BATCH_SIZE)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batches processed at once")
+    parser.add_argument("--dry-run", action="store_true", help="Only validate the input against LLDAP and report the plan")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    config = EnvironmentConfig()
+    log_listener = configure_logging(config.log_level, config.log_json)
+
+    auth_manager = AuthManager(
+        config.lldap_login_url, config.get_ldap_username(), config.ldap_bind_password,
+        renew_before_seconds=config.jwt_renew_before_seconds
+    )
+    await auth_manager.initialize()
+    graphql_client = GraphQLClient(
+        config.lldap_login_url, auth_manager,
+        pool_size=config.graphql_pool_size, keepalive_timeout=config.graphql_keepalive_seconds,
+        schema_cache_path=config.schema_cache_path,
+        timeout=config.lldap_timeout, retries=config.lldap_retries,
+        breaker=CircuitBreaker("LLDAP", config.circuit_breaker_failures, config.circuit_breaker_reset_seconds)
+    )
+    await graphql_client.initialize()
+    ldap_manager = LDAPManager(
+        config.ldap_server, config.ldap_bind_dn, config.ldap_bind_password, pool_size=config.ldap_pool_size,
+        timeout=config.ldap_timeout, retries=config.ldap_retries,
+        breaker=CircuitBreaker("LDAP", config.circuit_breaker_failures, config.circuit_breaker_reset_seconds)
+    )
+    user_manager = UserManager(graphql_client, ldap_manager, config.ldap_base_dn)
+
+    backfill = Backfill(
+        user_manager, args.output, args.checkpoint or f"{args.input}.checkpoint", args.group,
+        batch_size=args.batch_size or config.sync_batch_size, concurrency=args.concurrency
+    )
+    try:
+        await backfill.run(read_rows(args.input), dry_run=args.dry_run)
+    finally:
+        await graphql_client.close()
+        await ldap_manager.close()
+        await auth_manager.close()
+        log_listener.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
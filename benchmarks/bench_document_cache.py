@@ -0,0 +1,62 @@
+"""Micro-benchmark: per-call CPU cost of re-parsing GraphQL documents vs. the pre-parsed registry.
+
+Simulates the document handling a sync of N members would do (one lookup and one group
+mutation per member) and reports the CPU time spent parsing and validating documents.
+
+Usage: python benchmarks/bench_document_cache.py [members]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from gql import gql
+from graphql import validate
+from graphql_operations import DOCUMENTS, OPERATIONS
+from benchmarks.lldap_schema import LLDAP_SCHEMA
+
+PER_MEMBER_OPERATIONS = ["GetUserByDiscordId", "AddUserToGroup"]
+
+
+def reparse_every_call(members):
+    """Old behaviour: gql() plus schema validation on every request."""
+    for _ in range(members):
+        for name in PER_MEMBER_OPERATIONS:
+            document = gql(OPERATIONS[name])
+            validate(LLDAP_SCHEMA, document)
+
+
+def registry_lookup(members):
+    """New behaviour: documents are parsed and validated once, then looked up by name."""
+    prevalidated = set()
+    for document in DOCUMENTS.values():
+        validate(LLDAP_SCHEMA, document)
+        prevalidated.add(id(document))
+    for _ in range(members):
+        for name in PER_MEMBER_OPERATIONS:
+            document = DOCUMENTS[name]
+            if id(document) not in prevalidated:
+                validate(LLDAP_SCHEMA, document)
+
+
+def measure(func, members):
+    started = time.process_time()
+    func(members)
+    return time.process_time() - started
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    calls = members * len(PER_MEMBER_OPERATIONS)
+    before = measure(reparse_every_call, members)
+    after = measure(registry_lookup, members)
+    print(f"Simulated sync of {members} members ({calls} requests)")
+    print(f"  re-parse every call: {before:.3f}s CPU ({before / calls * 1e6:.1f}µs per call)")
+    print(f"  pre-parsed registry: {after:.3f}s CPU ({after / calls * 1e6:.2f}µs per call)")
+    if after > 0:
+        print(f"  speed-up: {before / after:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
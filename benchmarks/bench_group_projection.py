@@ -0,0 +1,87 @@
+"""Micro-benchmark: decoding a group members response with full attributes vs. IDs only.
+
+Builds synthetic LLDAP GetGroupsDetails responses for a group of N members, each with K custom
+attributes, then measures response size, decode + mapping CPU time and peak memory for the old
+projection (id, displayName, attributes) and the new one (id only, mapped via the Discord ID index).
+
+Usage: python benchmarks/bench_group_projection.py [members] [attributes]
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from graphql import validate
+from graphql_operations import group_members_document
+from user_manager import UserManager
+from benchmarks.lldap_schema import LLDAP_SCHEMA
+
+
+def full_response(members, attributes):
+    users = []
+    for index in range(members):
+        user_attributes = [{"name": f"custom{a}", "value": [f"value-{index}-{a}"]} for a in range(attributes)]
+        user_attributes.append({"name": "discordid", "value": [str(100000000000000000 + index)]})
+        users.append({"id": f"user{index}", "displayName": f"User {index}", "attributes": user_attributes})
+    return json.dumps({"data": {"g0": {"users": users}}})
+
+
+def ids_response(members):
+    return json.dumps({"data": {"g0": {"users": [{"id": f"user{index}"} for index in range(members)]}}})
+
+
+def decode_full(body, _):
+    """Old behaviour: decode everything, then scan each member's attributes for discordid."""
+    ldap_users = {}
+    for user in json.loads(body)["data"]["g0"]["users"]:
+        discord_id = UserManager.get_attribute_value(user["attributes"], "discordid")
+        if discord_id:
+            ldap_users[discord_id] = user
+    return ldap_users
+
+
+def decode_ids(body, discord_id_index):
+    """New behaviour: decode member IDs only and map them through the Discord ID index."""
+    lldap_to_discord = {lldap_user_id: discord_id for discord_id, lldap_user_id in discord_id_index.items()}
+    ldap_users = {}
+    for user in json.loads(body)["data"]["g0"]["users"]:
+        discord_id = lldap_to_discord.get(user["id"])
+        if discord_id:
+            ldap_users[discord_id] = user["id"]
+    return ldap_users
+
+
+def measure(func, body, discord_id_index):
+    tracemalloc.start()
+    started = time.process_time()
+    result = func(body, discord_id_index)
+    elapsed = time.process_time() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    attributes = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    assert not validate(LLDAP_SCHEMA, group_members_document(1)), "group members query no longer matches the schema"
+
+    # The sync already holds this index, so building it is not part of the per-group cost
+    discord_id_index = {str(100000000000000000 + index): f"user{index}" for index in range(members)}
+    before_body = full_response(members, attributes)
+    after_body = ids_response(members)
+
+    before, before_time, before_peak = measure(decode_full, before_body, discord_id_index)
+    after, after_time, after_peak = measure(decode_ids, after_body, discord_id_index)
+    assert before.keys() == after.keys()
+
+    print(f"Group of {members} members with {attributes} custom attributes each")
+    print(f"  full attributes: {len(before_body) / 1e6:.1f} MB response, {before_time:.3f}s CPU, {before_peak / 1e6:.1f} MB peak")
+    print(f"  member IDs only: {len(after_body) / 1e6:.1f} MB response, {after_time:.3f}s CPU, {after_peak / 1e6:.1f} MB peak")
+
+
+if __name__ == "__main__":
+    main()
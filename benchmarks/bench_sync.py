@@ -0,0 +1,156 @@
+"""Offline benchmark suite for the sync and registration paths.
+
+Runs the real AuthManager, GraphQLClient, UserManager, SubscriptionSync and DiscordBot against a
+local fake LLDAP (benchmarks/fake_lldap.py), an in-process LDAP stand-in and a synthetic guild.
+For each scenario it reports the requests issued to LLDAP, wall time and peak traced memory
+(which includes the fake server's own allocations).
+
+Scenarios:
+  no_changes      every role holder is already in the LLDAP group
+  adds            registered role holders missing from the group
+  removals        group members who no longer hold the role
+  register_burst  concurrent /register commands from unregistered role holders
+
+Usage: python benchmarks/bench_sync.py [--members 10000] [--changes 5000] [--registrations 500]
+                                       [--latency-ms 0] [--lean] [scenario ...]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from auth_manager import AuthManager
+from discord_bot import DiscordBot
+from graphql_client import GraphQLClient
+from logging_config import configure_logging
+from mutation_executor import MutationExecutor
+from role_index import RoleHolderIndex
+from role_mapping import GuildRoleMappings, RoleGroupMapping, RoleMappingTable
+from subscription_sync import SubscriptionSync
+from user_manager import UserManager
+from benchmarks.fake_lldap import FakeLLDAP, InProcessLDAPManager
+from benchmarks.synthetic_discord import FakeClient, FakeGuild, FakeInteraction, FakeRole
+
+GROUP_ID = 4
+ROLE = FakeRole(1000, "Subscriber")
+OTHER_ROLE = FakeRole(1001, "Member")
+
+
+def discord_id(index):
+    return 100000000000000000 + index
+
+
+def build_guild(members, role_holders):
+    """A guild of `members` members where the first `role_holders` hold the mapped role."""
+    guild = FakeGuild(1, "Benchmark Guild", [ROLE, OTHER_ROLE])
+    for index in range(members):
+        guild.add_member(discord_id(index), f"member{index}", [ROLE] if index < role_holders else [OTHER_ROLE])
+    return guild
+
+
+def seed_lldap(fake, users, in_group):
+    """Registers `users` LLDAP users linked to the guild's first members; the first `in_group` are in the group."""
+    fake.add_group(GROUP_ID, "subscribers")
+    for index in range(users):
+        fake.add_user(f"member{index}", f"member{index}@example.com", str(discord_id(index)),
+                      [GROUP_ID] if index < in_group else [])
+
+
+def scenario_setup(name, args):
+    """Returns (fake LLDAP, guild) for a scenario, sized from the command line arguments."""
+    fake = FakeLLDAP(latency=args.latency_ms / 1000)
+    if name == "no_changes":
+        seed_lldap(fake, args.members, args.members)
+        guild = build_guild(args.members, args.members)
+    elif name == "adds":
+        seed_lldap(fake, args.members, args.members - args.changes)
+        guild = build_guild(args.members, args.members)
+    elif name == "removals":
+        seed_lldap(fake, args.members, args.members)
+        guild = build_guild(args.members, args.members - args.changes)
+    elif name == "register_burst":
+        seed_lldap(fake, 0, 0)
+        guild = build_guild(args.members, args.members)
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+    return fake, guild
+
+
+async def run_scenario(name, args):
+    fake, guild = scenario_setup(name, args)
+    url = await fake.start()
+    auth_manager = AuthManager(url, "admin", "password")
+    await auth_manager.initialize()
+    graphql_client = GraphQLClient(url, auth_manager)
+    await graphql_client.initialize()
+    ldap_manager = InProcessLDAPManager(latency=args.ldap_latency_ms / 1000)
+    user_manager = UserManager(graphql_client, ldap_manager, "dc=example,dc=com")
+    role_mappings = GuildRoleMappings(RoleMappingTable([RoleGroupMapping(ROLE.name, GROUP_ID)]))
+    sync = SubscriptionSync(FakeClient([guild]), user_manager, role_mappings, MutationExecutor(10),
+                            role_index=RoleHolderIndex() if args.lean else None)
+    bot = DiscordBot("token", sync, "Benchmark")
+
+    if name == "register_burst":
+        interactions = [FakeInteraction(member) for member in guild.members[:args.registrations]]
+
+        async def action():
+            await asyncio.gather(*(
+                bot.register_command(interaction, f"{interaction.user.name}@example.com", interaction.user.name)
+                for interaction in interactions
+            ))
+    else:
+        async def action():
+            await sync.sync(force=True)  # Measure every removal rather than the removal guard
+
+    fake.requests.clear()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        await action()
+        wall = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        await graphql_client.close()
+        await ldap_manager.close()
+        await auth_manager.close()
+        await fake.close()
+
+    members_in_group = len(fake.groups[GROUP_ID]["members"])
+    requests = sum(fake.requests.values())
+    breakdown = ", ".join(f"{operation}={count}" for operation, count in fake.requests.most_common())
+    print(f"{name}: {wall:.2f}s wall, {requests} LLDAP requests, {peak / 1e6:.1f} MB peak, "
+          f"{members_in_group} group members after")
+    print(f"  requests: {breakdown or 'none'}")
+    if name == "register_burst":
+        print(f"  passwords set: {len(ldap_manager.passwords)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the sync and registration paths.")
+    parser.add_argument("scenarios", nargs="*", default=["no_changes", "adds", "removals", "register_burst"])
+    parser.add_argument("--members", type=int, default=10_000, help="Guild members, all holding the role in sync scenarios")
+    parser.add_argument("--changes", type=int, default=5_000, help="Adds or removals in the adds/removals scenarios")
+    parser.add_argument("--registrations", type=int, default=500, help="Concurrent /register commands in register_burst")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latency added to every fake LLDAP request")
+    parser.add_argument("--ldap-latency-ms", type=float, default=0, help="Latency added to every LDAP password change")
+    parser.add_argument("--lean", action="store_true", help="Use the role holder index instead of the member list")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    log_listener = configure_logging("WARNING")
+    try:
+        for name in args.scenarios:
+            await run_scenario(name, args)
+    finally:
+        log_listener.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
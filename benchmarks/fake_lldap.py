@@ -0,0 +1,205 @@
+"""In-process stand-ins for LLDAP's HTTP API and LDAP password changes, for offline benchmarks.
+
+FakeLLDAP serves /auth/simple/login, /auth/refresh and /api/graphql from an aiohttp app, executing
+GraphQL against the trimmed LLDAP schema over in-memory users and groups. Every request can be
+delayed by a fixed latency, and requests are counted per GraphQL operation.
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from collections import Counter
+from aiohttp import web
+from graphql import ExecutionResult, OperationDefinitionNode, execute, parse, validate
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ldap_manager import LDAPManager
+from benchmarks.lldap_schema import LLDAP_SCHEMA
+
+
+def make_jwt(ttl_seconds):
+    """Builds an unsigned JWT-shaped token whose `exp` claim AuthManager can read."""
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return f"{encode({'alg': 'none'})}.{encode({'exp': int(time.time() + ttl_seconds)})}.sig"
+
+
+class FakeLLDAP:
+    """A fake LLDAP server holding users and groups in memory."""
+
+    def __init__(self, latency=0.0, token_ttl=3600):
+        self.latency = latency  # Seconds added to every HTTP request
+        self.token_ttl = token_ttl
+        self.users = {}  # User ID -> {"id", "email", "displayName", "attributes"}
+        self.groups = {}  # Group ID -> {"id", "displayName", "members": set of user IDs}
+        self.requests = Counter()  # Endpoint or GraphQL operation name -> request count
+        self.documents = {}  # Query text -> (parsed document, operation name, validation errors)
+        self.runner = None
+        self.url = None
+
+    # Data setup
+
+    def add_group(self, group_id, name):
+        self.groups[group_id] = {"id": group_id, "displayName": name, "members": set()}
+
+    def add_user(self, user_id, email, discord_id=None, group_ids=()):
+        attributes = [{"name": "discordid", "value": [discord_id]}] if discord_id else []
+        self.users[user_id] = {"id": user_id, "email": email, "displayName": user_id, "attributes": attributes}
+        for group_id in group_ids:
+            self.groups[group_id]["members"].add(user_id)
+
+    # GraphQL resolvers, called by graphql-core's default resolver as root fields
+
+    @staticmethod
+    def attribute(user, name):
+        for attribute in user["attributes"]:
+            if attribute["name"] == name:
+                return attribute["value"][0] if attribute["value"] else None
+        return None
+
+    def matches(self, user, filters):
+        if not filters:
+            return True
+        if "eq" in filters:
+            field, value = filters["eq"]["field"], filters["eq"]["value"]
+            return (user["email"] if field == "email" else self.attribute(user, field)) == value
+        if "memberOfId" in filters:
+            return user["id"] in self.groups.get(filters["memberOfId"], {"members": ()})["members"]
+        if "all" in filters:
+            return all(self.matches(user, f) for f in filters["all"])
+        if "any" in filters:
+            return any(self.matches(user, f) for f in filters["any"])
+        if "not" in filters:
+            return not self.matches(user, filters["not"])
+        return True
+
+    def users_resolver(self, info, filters=None):
+        return [user for user in self.users.values() if self.matches(user, filters)]
+
+    def group_resolver(self, info, groupId):
+        group = self.groups.get(groupId)
+        if group is None:
+            raise Exception(f"Group {groupId} not found")
+        return {"id": group["id"], "displayName": group["displayName"], "users": [self.users[u] for u in group["members"]]}
+
+    def create_user_resolver(self, info, user):
+        user_id = user["id"].lower()
+        if user_id in self.users:
+            raise Exception("UNIQUE constraint failed: users.user_id")
+        self.users[user_id] = {
+            "id": user_id, "email": user.get("email") or "", "displayName": user.get("displayName") or user_id,
+            "attributes": [dict(attribute) for attribute in user.get("attributes") or []],
+        }
+        return self.users[user_id]
+
+    def update_user_resolver(self, info, user):
+        existing = self.users[user["id"]]
+        for attribute in user.get("insertAttributes") or []:
+            existing["attributes"] = [a for a in existing["attributes"] if a["name"] != attribute["name"]] + [dict(attribute)]
+        return {"ok": True}
+
+    def add_user_to_group_resolver(self, info, userId, groupId):
+        if userId not in self.users or groupId not in self.groups:
+            raise Exception(f"Cannot add {userId} to group {groupId}")
+        self.groups[groupId]["members"].add(userId)
+        return {"ok": True}
+
+    def remove_user_from_group_resolver(self, info, userId, groupId):
+        self.groups[groupId]["members"].discard(userId)
+        return {"ok": True}
+
+    def root(self):
+        """The root value graphql-core resolves top-level query and mutation fields against."""
+        return _Root(self)
+
+    # HTTP handlers
+
+    async def handle_login(self, request):
+        self.requests["/auth/simple/login"] += 1
+        await asyncio.sleep(self.latency)
+        return web.json_response({"token": make_jwt(self.token_ttl), "refreshToken": "refresh"})
+
+    async def handle_refresh(self, request):
+        self.requests["/auth/refresh"] += 1
+        await asyncio.sleep(self.latency)
+        return web.json_response({"token": make_jwt(self.token_ttl)})
+
+    def prepare(self, query):
+        """Parses and validates each distinct query once, like a real server's compiled query cache.
+
+        Keeps graphql-core's (slow) validation of large batch documents out of the measurements.
+        """
+        prepared = self.documents.get(query)
+        if prepared is None:
+            document = parse(query)
+            name = next(
+                (d.name.value for d in document.definitions if isinstance(d, OperationDefinitionNode) and d.name), "anonymous"
+            )
+            prepared = self.documents[query] = (document, name, validate(LLDAP_SCHEMA, document))
+        return prepared
+
+    async def handle_graphql(self, request):
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return web.Response(status=401)
+        body = await request.json()
+        document, name, errors = self.prepare(body["query"])
+        self.requests[name] += 1
+        await asyncio.sleep(self.latency)
+        if errors:
+            result = ExecutionResult(None, errors)
+        else:
+            result = execute(LLDAP_SCHEMA, document, root_value=self.root(), variable_values=body.get("variables"))
+        response = {"data": result.data}
+        if result.errors:
+            response["errors"] = [error.formatted for error in result.errors]
+        return web.json_response(response)
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/auth/simple/login", self.handle_login)
+        app.router.add_post("/auth/refresh", self.handle_refresh)
+        app.router.add_post("/api/graphql", self.handle_graphql)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_host, bound_port = self.runner.addresses[0][:2]
+        self.url = f"http://{bound_host}:{bound_port}"
+        return self.url
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+class _Root:
+    """Maps GraphQL root field names to FakeLLDAP resolvers."""
+
+    def __init__(self, fake):
+        self.users = fake.users_resolver
+        self.group = fake.group_resolver
+        self.createUser = fake.create_user_resolver
+        self.updateUser = fake.update_user_resolver
+        self.addUserToGroup = fake.add_user_to_group_resolver
+        self.removeUserFromGroup = fake.remove_user_from_group_resolver
+
+
+class InProcessLDAPManager(LDAPManager):
+    """LDAPManager whose worker threads record password changes instead of talking to an LDAP server.
+
+    The real thread pool and executor hand-off are kept, so their overhead is part of the measurement.
+    """
+
+    def __init__(self, latency=0.0, pool_size=4):
+        super().__init__("ldap://localhost", "uid=admin,ou=people,dc=example,dc=com", "password", pool_size=pool_size)
+        self.latency = latency
+        self.passwords = {}
+
+    def _modify_password(self, user_dn, new_password):
+        if self.latency:
+            time.sleep(self.latency)
+        self.passwords[user_dn] = new_password
+        return {"description": "success", "message": ""}
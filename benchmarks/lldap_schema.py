@@ -0,0 +1,83 @@
+from graphql import build_schema
+
+# A trimmed-down copy of the LLDAP GraphQL schema covering the operations this bot uses.
+LLDAP_SCHEMA_SDL = """
+type Query {
+    users(filters: RequestFilter): [User!]!
+    user(userId: String!): User!
+    groups: [Group!]!
+    group(groupId: Int!): Group!
+}
+
+type Mutation {
+    createUser(user: CreateUserInput!): User!
+    updateUser(user: UpdateUserInput!): Success!
+    addUserToGroup(userId: String!, groupId: Int!): Success!
+    removeUserFromGroup(userId: String!, groupId: Int!): Success!
+}
+
+input RequestFilter {
+    any: [RequestFilter!]
+    all: [RequestFilter!]
+    not: RequestFilter
+    eq: EqualityConstraint
+    memberOf: String
+    memberOfId: Int
+}
+
+input EqualityConstraint {
+    field: String!
+    value: String!
+}
+
+input CreateUserInput {
+    id: String!
+    email: String
+    displayName: String
+    firstName: String
+    lastName: String
+    avatar: String
+    attributes: [AttributeValueInput!]
+}
+
+input UpdateUserInput {
+    id: String!
+    email: String
+    displayName: String
+    firstName: String
+    lastName: String
+    avatar: String
+    removeAttributes: [String!]
+    insertAttributes: [AttributeValueInput!]
+}
+
+input AttributeValueInput {
+    name: String!
+    value: [String!]!
+}
+
+type User {
+    id: String!
+    email: String!
+    displayName: String!
+    attributes: [AttributeValue!]!
+    groups: [Group!]!
+}
+
+type Group {
+    id: Int!
+    displayName: String!
+    users: [User!]!
+}
+
+type AttributeValue {
+    name: String!
+    value: [String!]!
+}
+
+type Success {
+    ok: Boolean!
+}
+"""
+
+LLDAP_SCHEMA = build_schema(LLDAP_SCHEMA_SDL)
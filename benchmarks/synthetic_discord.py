@@ -0,0 +1,71 @@
+"""A synthetic Discord guild/member/role model with just the surface SubscriptionSync and DiscordBot use."""
+
+
+class FakeRole:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+
+
+class FakeMember:
+    def __init__(self, member_id, name, roles, guild=None):
+        self.id = member_id
+        self.name = name
+        self.roles = list(roles)
+        self.guild = guild
+        self.role_ids = {role.id for role in roles}
+
+    def get_role(self, role_id):
+        return role_id if role_id in self.role_ids else None
+
+
+class FakeGuild:
+    def __init__(self, guild_id, name, roles):
+        self.id = guild_id
+        self.name = name
+        self.roles = list(roles)
+        self.members = []
+        self.members_by_id = {}
+
+    def add_member(self, member_id, name, roles):
+        member = FakeMember(member_id, name, roles, guild=self)
+        self.members.append(member)
+        self.members_by_id[member_id] = member
+        return member
+
+    def get_member(self, member_id):
+        return self.members_by_id.get(member_id)
+
+    async def chunk(self, cache=True):
+        return list(self.members)
+
+
+class FakeClient:
+    def __init__(self, guilds):
+        self.guilds = list(guilds)
+
+
+class FakeResponse:
+    async def defer(self, ephemeral=False, thinking=False):
+        pass
+
+    async def send_message(self, content, ephemeral=False):
+        pass
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content, ephemeral=False):
+        self.messages.append(content)
+
+
+class FakeInteraction:
+    """An application command interaction invoked by a guild member."""
+
+    def __init__(self, member):
+        self.user = member
+        self.guild = member.guild
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import random
+import time
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BREAKER_STATE = REGISTRY.gauge(
+    "circuit_breaker_state", "Circuit breaker state by backend (0 = closed, 1 = half-open, 2 = open).", ["backend"]
+)
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes by backend and new state.", ["backend", "state"]
+)
+RETRIES = REGISTRY.counter("backend_retries_total", "Calls retried after a transient failure, by backend.", ["backend"])
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fails calls fast while a backend is unhealthy and lets a single probe through to detect recovery.
+
+    After `failure_threshold` consecutive failures the breaker opens. Once `reset_timeout` seconds
+    have passed, the next call is let through as a probe (half-open): success closes the breaker,
+    failure opens it again for another `reset_timeout`.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        BREAKER_STATE.set(0, name)
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            BREAKER_STATE.set(self.STATES[state], self.name)
+            BREAKER_TRANSITIONS.inc(self.name, state)
+
+    @property
+    def retry_after(self):
+        """Seconds until an open breaker lets a probe through (0 if calls are allowed now)."""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allows_request(self):
+        """Returns whether a call would be let through right now, without starting a probe."""
+        if self.state == "closed":
+            return True
+        return not self.probe_in_flight and self.retry_after == 0
+
+    def before_call(self):
+        """Raises CircuitOpenError unless the call may proceed; may start a half-open probe."""
+        if self.state == "closed":
+            return
+        if self.state == "open" and self.retry_after == 0:
+            self._set_state("half_open")
+            logger.info(f"🩺 Probing {self.name} for recovery...")
+        if self.state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return
+        raise CircuitOpenError(f"{self.name} is unavailable; next attempt in {self.retry_after:.1f}s")
+
+    def record_success(self):
+        self.failures = 0
+        self.probe_in_flight = False
+        if self.state != "closed":
+            logger.info(f"✅ {self.name} has recovered; circuit closed.")
+            self._set_state("closed")
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            logger.warning(f"🔌 {self.name} looks unhealthy after {self.failures} failures; "
+                           f"failing calls fast for {self.reset_timeout}s.")
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+    def record_ignored(self):
+        """Ends a call whose outcome says nothing about the backend's health (e.g. a rejected request)."""
+        self.probe_in_flight = False
+
+    async def call(self, coroutine_function, *args, is_failure=lambda e: True):
+        """Awaits `coroutine_function(*args)` through the breaker.
+
+        Exceptions for which `is_failure` returns False (such as validation errors) are re-raised
+        without counting against the backend.
+        """
+        self.before_call()
+        try:
+            result = await coroutine_function(*args)
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.record_ignored()
+            raise
+        except BaseException:
+            self.record_ignored()  # Cancelled; the backend's health is unknown
+            raise
+        self.record_success()
+        return result
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff: a random delay up to base_delay * 2^attempt, capped at max_delay."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+async def retry_with_backoff(coroutine_function, *args, retries=2, base_delay=0.5, max_delay=10, should_retry=lambda e: True,
+                             backend="backend"):
+    """Awaits `coroutine_function(*args)`, retrying up to `retries` times with jittered exponential backoff.
+
+    Only use this for idempotent calls. An open circuit breaker is never retried here.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await coroutine_function(*args)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if attempt == retries or not should_retry(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            RETRIES.inc(backend)
+            logger.warning(f"🔁 {backend} call failed ({e!r}); retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
@@ -1,63 +1,245 @@
+import asyncio
+import hashlib
+import json
+import logging
 import discord
 from discord.ext import tasks
 from discord import app_commands
+from metrics import REGISTRY, StageTimings, StartupTimer
+from sync_scheduler import SyncScheduler
+
+logger = logging.getLogger(__name__)
 
 class DiscordBot:
     """Handles Discord bot setup, commands, and background tasks."""
     
-    def __init__(self, token, subscriber_role_name, subscriptions_sync, service_name, lifetime_role_name="Subscriber", lifetime_group_id=4):
+    def __init__(self, token, subscriptions_sync, service_name, full_sync_interval_minutes=360, event_sync_interval_seconds=5,
+                 sharded=False, shard_count=None, lean_member_cache=False, sync_debounce_seconds=2, leader_lease=None):
         intents = discord.Intents.default()
         intents.guilds = True
         intents.members = True
-        self.bot = discord.Client(intents=intents)
+        client_options = {"intents": intents}
+        if lean_member_cache:
+            # Keep no members in discord.py's cache; role holders are tracked in a compact index instead
+            client_options.update(member_cache_flags=discord.MemberCacheFlags.none(), chunk_guilds_at_startup=False)
+        if sharded:
+            # Spread large or multiple guilds over several gateway connections
+            self.bot = discord.AutoShardedClient(shard_count=shard_count, **client_options)
+        else:
+            self.bot = discord.Client(**client_options)
+        self.lean_member_cache = lean_member_cache
         self.tree = app_commands.CommandTree(self.bot)
         self.token = token
-        self.subscriber_role_name = subscriber_role_name
-        self.lifetime_role_name = lifetime_role_name
-        self.lifetime_group_id = lifetime_group_id
+        self.role_mappings = subscriptions_sync.role_mappings  # GuildRoleMappings
         self.subscriptions_sync = subscriptions_sync
+        self.sync_scheduler = SyncScheduler(subscriptions_sync, sync_debounce_seconds)
         self.user_manager = subscriptions_sync.user_manager
         self.lldap_login_url = None
         self.service_name = service_name
         self.public_url = None
+        self.full_sync_interval_minutes = full_sync_interval_minutes
+        self.event_sync_interval_seconds = event_sync_interval_seconds
+        self.register_timings = StageTimings(REGISTRY.histogram(
+            "discord_register_stage_seconds", "Time spent in each stage of handling /register.", ["stage"]
+        ))
+        self.lldap_ready = None  # Task that finishes once the LLDAP session is usable
+        self.startup_timer = StartupTimer()
+        self.startup_reported = False
+        self.synced_commands_hash = None
+        self.leader_lease = leader_lease  # LeaderLease when several replicas run; only its holder syncs
+        if leader_lease is not None:
+            leader_lease.listeners.append(self.on_leadership_change)
+
+    async def start(self, lldap_login_url, public_url, lldap_ready=None, startup_timer=None):
+        """Starts the Discord bot within the existing event loop.
 
-    async def start(self, lldap_login_url, public_url):
-        """Starts the Discord bot within the existing event loop."""
+        The gateway connects while `lldap_ready` (if given) is still warming up the LLDAP session;
+        the background sync loops only start once it has finished.
+        """
         self.lldap_login_url = lldap_login_url
         self.public_url = public_url
+        self.lldap_ready = lldap_ready
+        if startup_timer is not None:
+            self.startup_timer = startup_timer
         self.setup_commands()
         self.bot.event(self.on_ready)
-        await self.bot.start(self.token)
+        if self.lean_member_cache:
+            self.install_raw_member_update_hook()
+            self.bot.event(self.on_member_join)
+            self.bot.event(self.on_raw_member_remove)
+        else:
+            self.bot.event(self.on_member_update)
+            self.bot.event(self.on_member_remove)
+        self.bot.event(self.on_guild_role_delete)
+        self.bot.event(self.on_guild_role_update)
+        self.sync_subscriptions.change_interval(minutes=self.full_sync_interval_minutes)
+        self.apply_member_events.change_interval(seconds=self.event_sync_interval_seconds)
+        with self.startup_timer.time("discord_login"):
+            await self.bot.login(self.token)
+        await self.bot.connect()
 
     async def on_ready(self):
         """Handles bot startup, syncs commands, and starts background tasks."""
-        print(f"✅ {self.bot.user} is online!")
+        logger.info(f"✅ {self.bot.user} is online!")
+        if not self.startup_reported:
+            self.startup_timer.mark("discord_ready")
         try:
-            synced = await self.tree.sync()
-            print(f"Synced {len(synced)} command(s)")
+            await self.sync_command_tree()
         except Exception as e:
-            print(f"Failed to sync commands: {e}")
-        self.sync_subscriptions.start()
+            logger.error(f"Failed to sync commands: {e}")
+        await self.wait_for_lldap()
+        # on_ready fires again after gateway reconnects, so only start the loops once
+        if self.sync_subscriptions.is_running():
+            # The session could not be resumed, so member updates may have been missed; catch up with a full sync
+            logger.info("🔄 Reconnected to the gateway. Scheduling a full sync...")
+            self.subscriptions_sync.full_sync_requested = True
+            self.subscriptions_sync.role_index_stale = True
+        else:
+            self.sync_subscriptions.start()
+        if not self.apply_member_events.is_running():
+            self.apply_member_events.start()
+        if not self.startup_reported:
+            self.startup_timer.mark("total")
+            logger.info(f"🚀 Startup complete: {self.startup_timer.summary()}")
+            self.startup_reported = True
+
+    def is_sync_leader(self):
+        """Whether this replica runs syncs: always when running alone, otherwise only while holding the lease."""
+        return self.leader_lease is None or self.leader_lease.is_leader
+
+    def on_leadership_change(self, leader):
+        if leader:
+            # Role changes seen while on standby were dropped, so catch up with a full sync. This
+            # replica's snapshot misses the previous leader's writes, so it re-reads LLDAP.
+            self.subscriptions_sync.full_sync_requested = True
+            self.subscriptions_sync.full_sync_refresh = True
+
+    async def wait_for_lldap(self):
+        """Waits until the LLDAP session is usable; commands can arrive while it is still warming up."""
+        if self.lldap_ready is not None:
+            # Shielded so that a cancelled command never cancels the shared startup task
+            await asyncio.shield(self.lldap_ready)
+
+    def command_tree_hash(self):
+        """Returns a hash of the slash command definitions registered for this application."""
+        commands = sorted((command.to_dict() for command in self.tree.get_commands()), key=lambda command: command["name"])
+        payload = json.dumps([self.bot.application_id, commands], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def sync_command_tree(self):
+        """Syncs the slash commands with Discord, unless this exact command set was synced before.
+
+        The hash of the last synced command set is kept in the state store, so restarts that don't
+        change any command skip the rate-limited sync call.
+        """
+        state_store = self.subscriptions_sync.state_store
+        commands_hash = self.command_tree_hash()
+        if self.synced_commands_hash is None and state_store is not None:
+            self.synced_commands_hash = state_store.get_meta("command_tree_hash")
+        if commands_hash == self.synced_commands_hash:
+            logger.info("Slash commands are unchanged; skipping command sync.")
+            return
+        with self.startup_timer.time("command_sync"):
+            synced = await self.tree.sync()
+        logger.info(f"Synced {len(synced)} command(s)")
+        self.synced_commands_hash = commands_hash
+        if state_store is not None:
+            state_store.set_meta("command_tree_hash", commands_hash)
+
+    def install_raw_member_update_hook(self):
+        """Feeds GUILD_MEMBER_UPDATE payloads to the role holder index.
+
+        discord.py discards updates for members it hasn't cached and has no raw event for them,
+        so the gateway parser is wrapped to read the member ID, username and role IDs directly.
+        """
+        parsers = self.bot._connection.parsers
+        parse_member_update = parsers["GUILD_MEMBER_UPDATE"]
+
+        def parse_and_index(data):
+            user = data["user"]
+            self.subscriptions_sync.handle_raw_member_update(
+                int(data["guild_id"]), int(user["id"]), user.get("username"), [int(role_id) for role_id in data.get("roles", [])]
+            )
+            parse_member_update(data)
+
+        parsers["GUILD_MEMBER_UPDATE"] = parse_and_index
+
+    async def on_member_join(self, member: discord.Member):
+        """Indexes members who join with mapped roles already assigned."""
+        self.subscriptions_sync.handle_raw_member_update(member.guild.id, member.id, member.name, [role.id for role in member.roles])
+
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        """Queues LLDAP group removals when an uncached member leaves the server."""
+        self.subscriptions_sync.queue_raw_member_remove(payload.guild_id, payload.user.id)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        """Queues LLDAP group changes when a member's roles change."""
+        if before.roles != after.roles:
+            self.subscriptions_sync.queue_member_update(before, after)
+
+    async def on_member_remove(self, member: discord.Member):
+        """Queues LLDAP group removals when a member leaves the server."""
+        self.subscriptions_sync.queue_member_remove(member)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        """Schedules a full sync when a mapped role is deleted."""
+        self.subscriptions_sync.queue_role_change(role)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        """Schedules a full sync when a mapped role is renamed, or a role is renamed to a mapped name."""
+        if before.name != after.name:
+            self.subscriptions_sync.queue_role_change(before)
+            self.subscriptions_sync.queue_role_change(after)
 
     @staticmethod
     def is_admin(interaction: discord.Interaction):
         """Checks if the user has admin permissions."""
         return interaction.user.guild_permissions.administrator
 
+    @staticmethod
+    def format_plan(plan, limit=1800):
+        """Formats a SyncPlan summary as a code block that fits in a Discord message."""
+        summary = plan.summary()
+        if len(summary) > limit:
+            summary = summary[:limit].rsplit("\n", 1)[0] + "\n…"
+        return f"```\n{summary}\n```"
+
     async def register_command(self, interaction: discord.Interaction, email: str, username: str = None):
         """Handles the /register command to create a new LLDAP user with appropriate group assignment."""
+        with self.register_timings.time("total"):
+            # Defer straight away so slow LLDAP calls can't run past Discord's 3-second interaction deadline
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            try:
+                await self.wait_for_lldap()
+                await self.handle_registration(interaction, email, username)
+            except Exception as e:
+                # LLDAP down, timed out or behind an open circuit breaker; never leave the user on "thinking…"
+                logger.exception(f"❌ /register failed for {interaction.user.id}: {e}")
+                await interaction.followup.send(
+                    "❌ Account registration is temporarily unavailable. Please try again in a few minutes.", ephemeral=True
+                )
+        logger.info(f"⏱️ /register timings: {self.register_timings.summary()}; "
+                    f"create_user: {self.user_manager.create_user_timings.summary()}")
+
+    async def handle_registration(self, interaction: discord.Interaction, email: str, username: str = None):
+        """Validates and creates the account for a deferred /register interaction, answering via followup."""
         guild = interaction.guild
-        member = guild.get_member(interaction.user.id)
-        subscriber_role = discord.utils.get(guild.roles, name=self.subscriber_role_name)
-        lifetime_role = discord.utils.get(guild.roles, name=self.lifetime_role_name)
+        role_mappings = self.role_mappings.for_guild(guild.id) if guild else None
+        if role_mappings is None:
+            await interaction.followup.send(
+                "❌ Account registration is not available in this server.", ephemeral=True
+            )
+            return
+        # The interaction carries the invoking member with their current roles, so no member cache is needed
+        member = interaction.user
 
-        # Check which roles the user has
-        has_subscriber = subscriber_role and subscriber_role in member.roles
-        has_lifetime = lifetime_role and lifetime_role in member.roles
+        # Check which mapped roles the user has
+        matched_mappings = role_mappings.matching(member.roles)
 
-        if not (has_subscriber or has_lifetime):
-            await interaction.response.send_message(
-                f"❌ You must have either the **{self.subscriber_role_name}** or **{self.lifetime_role_name}** role to register an account.", ephemeral=True
+        if not matched_mappings:
+            role_list = ", ".join(f"**{name}**" for name in role_mappings.role_names)
+            await interaction.followup.send(
+                f"❌ You must have one of the following roles to register an account: {role_list}.", ephemeral=True
             )
             return
 
@@ -69,38 +251,39 @@ class DiscordBot:
 
         # Validate username (alphanumeric and max 20 characters)
         if not chosen_username or not chosen_username.isalnum() or len(chosen_username) > 20:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 "❌ Username must be alphanumeric (letters and numbers only) and no longer than 20 characters.", ephemeral=True
             )
             return
 
-        # Check if email is already associated with an LLDAP account
-        if await self.user_manager.check_email_exists(normalized_email):
-            await interaction.response.send_message(
+        # Check both the email and the Discord ID against LLDAP in a single request
+        with self.register_timings.time("checks"):
+            email_exists, discord_id_exists = await self.user_manager.check_registration_conflicts(normalized_email, user_id)
+
+        if email_exists:
+            await interaction.followup.send(
                 "❌ This email is already associated with an account.", ephemeral=True
             )
             return
 
-        # Check if Discord ID is already linked to an LLDAP account
-        if await self.user_manager.check_discord_id_exists(user_id):
-            await interaction.response.send_message(
+        if discord_id_exists:
+            await interaction.followup.send(
                 "❌ You have already linked your Discord to an account.", ephemeral=True
             )
             return
 
-        # Determine account type message based on roles
-        account_type = self.lifetime_role_name if has_lifetime else self.subscriber_role_name
+        # Determine account type message based on roles; later (higher tier) mappings take precedence
+        account_type = matched_mappings[-1].role
         
         # Create user in LLDAP with appropriate group assignments
-        temp_password, error = await self.user_manager.create_user(
-            chosen_username, normalized_email, user_id, 
-            subscriber_group=has_subscriber, 
-            lifetime_group=has_lifetime,
-            lifetime_group_id=self.lifetime_group_id
-        )
+        with self.register_timings.time("create_user"):
+            temp_password, error = await self.user_manager.create_user(
+                chosen_username, normalized_email, user_id,
+                {mapping.group_id for mapping in matched_mappings}
+            )
 
         if temp_password:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f":white_check_mark: **__{self.service_name} {account_type} Account Created!__**\n\n"
                 f"__**Use this link to log in and change your password:**__ {self.public_url}\n\n"
                 f"**Username**: `{chosen_username}`\n"
@@ -109,11 +292,11 @@ class DiscordBot:
             )
         else:
             if "UNIQUE constraint failed" in str(error):
-                await interaction.response.send_message(
+                await interaction.followup.send(
                     "❌ This username or Discord ID is already in use.", ephemeral=True
                 )
             else:
-                await interaction.response.send_message(
+                await interaction.followup.send(
                     f"❌ Failed to create an account: {error}", ephemeral=True
                 )
 
@@ -129,21 +312,112 @@ class DiscordBot:
 
         @self.tree.command(name="sync_subscribers", description="Manually sync Discord subscribers with LLDAP")
         @app_commands.check(self.is_admin)
-        async def sync_subscribers(interaction: discord.Interaction):
-            await interaction.response.send_message(
-                "🔄 **Manually syncing subscribers...**", ephemeral=True
-            )
-            try:
-                await self.subscriptions_sync.sync()
-                await interaction.followup.send(
-                    "✅ **Subscriber sync completed successfully.**", ephemeral=True
+        @app_commands.describe(
+            dry_run="Only show the changes a sync would make",
+            force="Apply removals even when they exceed the removal guard"
+        )
+        async def sync_subscribers(interaction: discord.Interaction, dry_run: bool = False, force: bool = False):
+            if not dry_run and not self.is_sync_leader():
+                leader = await self.leader_lease.current_holder() or "another replica"
+                await interaction.response.send_message(
+                    f"💤 **This replica is on standby; syncs are run by {leader}.** A `dry_run` works here too.", ephemeral=True
                 )
+                return
+            if dry_run:
+                message = "📝 **Planning a subscriber sync without applying it...**"
+            elif self.sync_scheduler.running or self.sync_scheduler.queued is not None:
+                message = "🔄 **A sync is already scheduled; your request will be covered by the next run...**"
+            else:
+                message = "🔄 **Manually syncing subscribers...**"
+            await interaction.response.send_message(message, ephemeral=True)
+            try:
+                await self.wait_for_lldap()
+                # A manual sync always re-reads LLDAP
+                if dry_run:
+                    plan = await self.subscriptions_sync.plan(refresh=True)
+                    await interaction.followup.send(
+                        f"📝 **Dry run — nothing was changed:**\n{self.format_plan(plan)}", ephemeral=True
+                    )
+                    return
+                plan, report = await self.sync_scheduler.trigger(refresh=True, force=force)
+                message = f"✅ **Subscriber sync completed successfully.**\n{self.format_plan(plan)}"
+                guarded = self.subscriptions_sync.guarded_groups(plan)
+                if guarded and not force:
+                    labels = ", ".join(group.label for group in plan.groups if group.group_id in guarded)
+                    message += f"\n🛑 Removals were held back for {labels}; run again with `force` to apply them."
+                if report is not None and report.failed:
+                    message += f"\n⚠️ {len(report.failed)} changes failed; see the logs for details."
+                await interaction.followup.send(message, ephemeral=True)
             except Exception as e:
                 await interaction.followup.send(
                     f"❌ **Error during subscriber sync:** {e}", ephemeral=True
                 )
 
-    @tasks.loop(minutes=10)
+        @self.tree.command(name="profile_sync", description="Profile the next subscriber sync and save its hotspots")
+        @app_commands.check(self.is_admin)
+        @app_commands.describe(run_now="Start a sync right away instead of waiting for the next one")
+        async def profile_sync(interaction: discord.Interaction, run_now: bool = False):
+            if not self.is_sync_leader():
+                # Only the leader runs syncs, so a profiler armed here would never fire
+                leader = await self.leader_lease.current_holder() or "another replica"
+                await interaction.response.send_message(
+                    f"💤 **This replica is not the sync leader; syncs are run by {leader}.** "
+                    "Run `/profile_sync` there, or send it `SIGUSR2`.", ephemeral=True
+                )
+                return
+            profiler = self.subscriptions_sync.profiler
+            profiler.arm()
+            if not run_now:
+                await interaction.response.send_message(
+                    "🔬 **The next subscriber sync will be profiled.** The hotspots are written to "
+                    f"`{profiler.output_dir}/` and logged when it finishes.", ephemeral=True
+                )
+                return
+            await interaction.response.send_message("🔬 **Profiling a subscriber sync...**", ephemeral=True)
+            try:
+                await self.wait_for_lldap()
+                await self.sync_scheduler.trigger()
+                await interaction.followup.send(
+                    f"✅ **Sync profiled.** Hotspots: `{profiler.last_report_path}`", ephemeral=True
+                )
+            except Exception as e:
+                await interaction.followup.send(f"❌ **Error during the profiled sync:** {e}", ephemeral=True)
+
+        @self.tree.command(name="sync_status", description="Show the state of the subscriber sync")
+        @app_commands.check(self.is_admin)
+        async def sync_status(interaction: discord.Interaction):
+            status = self.sync_scheduler.status()
+            if self.leader_lease is not None:
+                if self.leader_lease.is_leader:
+                    status += f"\nReplica: {self.leader_lease.holder_id} (sync leader)"
+                else:
+                    leader = await self.leader_lease.current_holder() or "none"
+                    status += f"\nReplica: {self.leader_lease.holder_id} (standby, leader: {leader})"
+            await interaction.response.send_message(f"📊 **Sync status**\n{status}", ephemeral=True)
+
+    @tasks.loop(minutes=360)
     async def sync_subscriptions(self):
-        """Background task to sync Discord roles with LLDAP every 10 minutes."""
-        await self.subscriptions_sync.sync()
\ No newline at end of file
+        """Background safety-net task that fully reconciles Discord roles with LLDAP."""
+        if not self.is_sync_leader():
+            return
+        # Re-chunk the lean role holder index so member updates the gateway dropped can't leave it drifted
+        self.subscriptions_sync.role_index_stale = True
+        try:
+            await self.sync_scheduler.trigger()
+        except Exception:
+            # Already logged by the scheduler; an exception escaping here would stop the loop for good
+            logger.warning(f"⚠️ Scheduled full sync failed; retrying in {self.full_sync_interval_minutes} minutes.")
+
+    @tasks.loop(seconds=5)
+    async def apply_member_events(self):
+        """Background task that applies queued per-member role changes to LLDAP."""
+        if not self.is_sync_leader():
+            # The leader applies these; a standby catches up with a full sync when it takes over
+            self.subscriptions_sync.pending_changes.clear()
+            self.subscriptions_sync.full_sync_requested = self.subscriptions_sync.full_sync_refresh = False
+            return
+        try:
+            await self.subscriptions_sync.apply_pending_changes(full_sync=self.sync_scheduler.trigger)
+        except Exception as e:
+            # Keep the loop alive; the next run or full sync picks the changes up again
+            logger.exception(f"❌ Failed to apply member role changes: {e}")
@@ -1,5 +1,7 @@
 import os
+import socket
 from dotenv import load_dotenv
+from role_mapping import GuildRoleMappings, RoleGroupMapping, RoleMappingTable, load_role_mappings_file, parse_role_mappings
 
 class EnvironmentConfig:
     """Loads and stores environment variables for the application."""
@@ -13,11 +15,76 @@ class EnvironmentConfig:
         self.discord_bot_token = os.getenv("DISCORD_BOT_TOKEN")
         self.lldap_login_url = os.getenv("LLDAP_LOGIN_URL")
         self.subscriber_role_name = os.getenv("SUBSCRIBER_ROLE_NAME")
-        self.subscribers_group_id = int(os.getenv("SUBSCRIBERS_GROUP_ID"))
+        self.subscribers_group_id = self.get_optional_int("SUBSCRIBERS_GROUP_ID")
         self.lifetime_role_name = os.getenv("LIFETIME_ROLE_NAME")
-        self.lifetime_group_id = int(os.getenv("LIFETIME_GROUP_ID"))
+        self.lifetime_group_id = self.get_optional_int("LIFETIME_GROUP_ID")
+        self.role_mappings = self.load_role_mappings()
         self.service_name = os.getenv("SERVICE_NAME")
         self.public_url = os.getenv("PUBLIC_URL") or os.getenv("LLDAP_LOGIN_URL") # Default to 'lldap_login_url' if not set
+        self.full_sync_interval_minutes = int(os.getenv("FULL_SYNC_INTERVAL_MINUTES", "360"))
+        self.event_sync_interval_seconds = int(os.getenv("EVENT_SYNC_INTERVAL_SECONDS", "5"))
+        self.sync_debounce_seconds = float(os.getenv("SYNC_DEBOUNCE_SECONDS", "2"))
+        self.discord_sharded = os.getenv("DISCORD_SHARDED", "false").lower() in ("1", "true", "yes")
+        self.discord_shard_count = self.get_optional_int("DISCORD_SHARD_COUNT")  # None lets Discord decide
+        self.lean_member_cache = os.getenv("LEAN_MEMBER_CACHE", "false").lower() in ("1", "true", "yes")
+        self.discord_id_index_ttl = int(os.getenv("DISCORD_ID_INDEX_TTL_SECONDS", "600"))
+        self.registration_cache_size = int(os.getenv("REGISTRATION_CACHE_SIZE", "50000"))  # 0 disables the cache
+        self.registration_cache_ttl = int(os.getenv("REGISTRATION_CACHE_TTL_SECONDS", "600"))
+        self.registration_cache_negative_ttl = int(os.getenv("REGISTRATION_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+        self.sync_concurrency = int(os.getenv("SYNC_CONCURRENCY", "10"))
+        self.sync_rate_limit = float(os.getenv("SYNC_RATE_LIMIT", "0"))  # Requests per second, 0 = unlimited
+        self.sync_batch_size = int(os.getenv("SYNC_BATCH_SIZE", "50"))
+        # A full sync holds back a group's removals when they exceed both limits, unless forced
+        self.sync_max_removals = int(os.getenv("SYNC_MAX_REMOVALS", "50"))
+        self.sync_max_removal_percent = float(os.getenv("SYNC_MAX_REMOVAL_PERCENT", "25"))
+        self.graphql_pool_size = int(os.getenv("GRAPHQL_POOL_SIZE", "20"))
+        self.graphql_keepalive_seconds = int(os.getenv("GRAPHQL_KEEPALIVE_SECONDS", "30"))
+        self.lldap_timeout = float(os.getenv("LLDAP_TIMEOUT_SECONDS", "10"))
+        self.lldap_retries = int(os.getenv("LLDAP_RETRIES", "2"))
+        self.ldap_timeout = float(os.getenv("LDAP_TIMEOUT_SECONDS", "10"))
+        self.ldap_retries = int(os.getenv("LDAP_RETRIES", "2"))
+        self.circuit_breaker_failures = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+        self.circuit_breaker_reset_seconds = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+        self.jwt_renew_before_seconds = int(os.getenv("JWT_RENEW_BEFORE_SECONDS", "300"))
+        self.ldap_pool_size = int(os.getenv("LDAP_POOL_SIZE", "4"))
+        self.schema_cache_path = os.getenv("SCHEMA_CACHE_PATH", "schema_cache.json")  # Empty disables the cache
+        self.state_db_path = os.getenv("STATE_DB_PATH", "sync_state.db")  # Empty disables the local state store
+        self.ldap_refresh_interval_minutes = int(os.getenv("LDAP_REFRESH_INTERVAL_MINUTES", "1440"))
+        self.leader_lease_path = os.getenv("LEADER_LEASE_PATH", "")  # Empty runs a single replica without a lease
+        self.leader_lease_ttl = float(os.getenv("LEADER_LEASE_TTL_SECONDS", "30"))
+        self.replica_id = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        self.loop_lag_threshold_ms = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "250"))  # 0 disables the watchdog
+        self.profile_dir = os.getenv("PROFILE_DIR", "profiles")
+        self.log_level = os.getenv("LOG_LEVEL", "INFO")
+        self.log_json = os.getenv("LOG_FORMAT", "text").lower() == "json"
+        self.metrics_port = self.get_optional_int("METRICS_PORT")  # None disables the /metrics endpoint
+        self.metrics_host = os.getenv("METRICS_HOST", "0.0.0.0")
+
+    @staticmethod
+    def get_optional_int(name):
+        """Reads an integer environment variable, returning None if it is not set."""
+        value = os.getenv(name)
+        return int(value) if value else None
+
+    def load_role_mappings(self):
+        """Builds the role -> group mapping table.
+
+        ROLE_MAPPINGS_FILE (JSON, optionally per guild) takes precedence, then ROLE_MAPPINGS
+        ("Role=GroupId,..."), and otherwise the Subscriber and Lifetime variables are used as a
+        two-entry table. The last two apply to every guild.
+        """
+        mappings_file = os.getenv("ROLE_MAPPINGS_FILE")
+        if mappings_file:
+            return load_role_mappings_file(mappings_file)
+        mappings_spec = os.getenv("ROLE_MAPPINGS")
+        if mappings_spec:
+            return GuildRoleMappings(RoleMappingTable(parse_role_mappings(mappings_spec)))
+        mappings = []
+        if self.subscriber_role_name and self.subscribers_group_id is not None:
+            mappings.append(RoleGroupMapping(self.subscriber_role_name, self.subscribers_group_id))
+        if self.lifetime_role_name and self.lifetime_group_id is not None:
+            mappings.append(RoleGroupMapping(self.lifetime_role_name, self.lifetime_group_id))
+        return GuildRoleMappings(RoleMappingTable(mappings))
 
     def get_ldap_username(self):
         """Extracts the username from LDAP_BIND_DN (e.g., 'uid=admin,ou=people,dc=example,dc=com' → 'admin')."""
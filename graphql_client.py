@@ -1,6 +1,38 @@
+import asyncio
+import logging
+import time
+import aiohttp
 from gql import gql, Client
 from gql.transport.aiohttp import AIOHTTPTransport
-from gql.transport.exceptions import TransportServerError
+from gql.transport.exceptions import TransportClosed, TransportProtocolError, TransportQueryError, TransportServerError
+from graphql import GraphQLError, build_client_schema, get_introspection_query
+from circuit_breaker import CircuitBreaker, retry_with_backoff
+from graphql_operations import DOCUMENTS, get_document
+from metrics import REGISTRY, LatencyStats
+from schema_cache import SchemaCache
+
+logger = logging.getLogger(__name__)
+
+GRAPHQL_REQUEST_SECONDS = REGISTRY.histogram(
+    "lldap_graphql_request_seconds", "Latency of LLDAP GraphQL requests by operation and outcome.", ["operation", "outcome"]
+)
+
+INTROSPECTION_DOCUMENT = gql(get_introspection_query(descriptions=False))
+
+class PrevalidatedClient(Client):
+    """gql Client that skips re-validating documents already validated against the schema."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prevalidated = set()  # id() of module-level documents from graphql_operations
+        self.validate_once = set()  # id() of cached documents to mark prevalidated after their first validation
+
+    def validate(self, document):
+        if id(document) in self.prevalidated:
+            return
+        super().validate(document)
+        if id(document) in self.validate_once:
+            self.prevalidated.add(id(document))
 
 class GraphQLClient:
     """Handles GraphQL client setup and operations for LLDAP API."""
@@ -9,42 +41,264 @@ class GraphQLClient:
         """Custom exception for 401 Unauthorized errors."""
         pass
 
-    def __init__(self, login_url, auth_manager):
+    def __init__(self, login_url, auth_manager, pool_size=20, keepalive_timeout=30, schema_cache_path=None,
+                 timeout=10, retries=2, breaker=None):
         self.login_url = login_url
         self.auth_manager = auth_manager
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout  # Seconds before a single request is abandoned
+        self.retries = retries  # Extra attempts for queries that fail transiently; mutations are never retried
+        self.breaker = breaker or CircuitBreaker("LLDAP")
         self.client = None  # Initialized in initialize()
+        self.session = None  # Long-lived connected session, opened in initialize()
+        self.connector = None
+        self.batch_documents = {}  # Parsed batch documents keyed by their call signatures
+        self.latency = {}  # Operation name -> LatencyStats
+        self.schema_cache = SchemaCache(schema_cache_path, f"{login_url}/api/graphql")
+        self.schema_hash = None
+        self.schema_refreshed_at = 0.0
+        self.schema_lock = asyncio.Lock()
+        self.schema_refresh_task = None
 
     async def initialize(self):
-        """Initializes the GraphQL client with the current JWT token."""
-        jwt_token = await self.auth_manager.get_jwt_token()
+        """Opens a persistent, pooled GraphQL session against LLDAP.
+
+        The Authorization header is sent per request, so token refreshes never rebuild the transport.
+        The schema is loaded from the on-disk cache when possible and refreshed in the background.
+        """
+        # The connector is owned here rather than by the aiohttp session so that it survives reconnects
+        self.connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
         transport = AIOHTTPTransport(
             url=f"{self.login_url}/api/graphql",
-            headers={"Authorization": f"Bearer {jwt_token}"}
+            headers={"Authorization": f"Bearer {await self.auth_manager.get_jwt_token()}"},
+            client_session_args={"connector": self.connector, "connector_owner": False}
         )
-        self.client = Client(transport=transport, fetch_schema_from_transport=True)
+        self.client = PrevalidatedClient(transport=transport, fetch_schema_from_transport=False)
+        # Mutations are not safe to replay blindly, so only reconnects are retried automatically
+        self.session = await self.client.connect_async(reconnecting=True, retry_execute=False)
 
-    async def execute_query(self, query, variables=None):
-        """Executes a GraphQL query and returns the result."""
+        introspection = self.schema_cache.load()
+        if introspection:
+            try:
+                self.set_schema(introspection, self.schema_cache.schema_hash(introspection))
+                logger.info("✅ Loaded GraphQL schema from cache.")
+                self.schema_refresh_task = asyncio.create_task(self.refresh_schema_in_background())
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Cached GraphQL schema is unusable ({e}). Fetching a fresh copy...")
+        await self.refresh_schema()
+
+    def set_schema(self, introspection, schema_hash):
+        """Applies an introspection result as the client schema and re-validates the registered operations."""
+        self.client.introspection = introspection
+        self.client.schema = build_client_schema(introspection)
+        self.client.prevalidated.clear()
+        self.schema_hash = schema_hash
+        self.validate_operations()
+
+    async def refresh_schema(self):
+        """Fetches the schema by introspection, stores it on disk and applies it if it changed."""
+        async with self.schema_lock:
+            introspection = await self.execute_query(INTROSPECTION_DOCUMENT)
+            schema_hash = self.schema_cache.save(introspection)
+            self.schema_refreshed_at = time.monotonic()
+            if schema_hash != self.schema_hash:
+                self.set_schema(introspection, schema_hash)
+                logger.info("✅ Fetched and cached GraphQL schema from LLDAP.")
+
+    async def refresh_schema_in_background(self):
+        """Re-checks the cached schema against LLDAP without blocking startup."""
+        try:
+            await self.refresh_schema()
+        except Exception as e:
+            logger.warning(f"⚠️ Background GraphQL schema refresh failed: {e}")
+
+    def validate_operations(self):
+        """Validates every registered operation against the schema once, so requests can skip validation."""
+        if not self.client.schema:
+            return
+        for name, document in DOCUMENTS.items():
+            try:
+                self.client.validate(document)
+            except Exception as e:
+                raise ValueError(f"GraphQL operation {name} is invalid for this LLDAP schema: {e}") from e
+            self.client.prevalidated.add(id(document))
+
+    async def close(self):
+        """Closes the persistent session and its connection pool."""
+        if self.schema_refresh_task and not self.schema_refresh_task.done():
+            self.schema_refresh_task.cancel()
+        if self.client and self.session:
+            # gql leaves the aiohttp session open when it doesn't own the connector, so close it here
+            http_session = self.client.transport.session
+            await self.client.close_async()
+            if http_session:
+                await http_session.close()
+            self.session = None
+        if self.connector:
+            await self.connector.close()
+
+    @staticmethod
+    def is_backend_failure(error):
+        """Whether an error means LLDAP itself is unhealthy, rather than that it rejected the request."""
+        if isinstance(error, TransportServerError):
+            return error.code is None or error.code >= 500
+        return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError, OSError, TransportClosed, TransportProtocolError))
+
+    @staticmethod
+    def is_rejected(error):
+        """Whether LLDAP answered with a GraphQL error for the request itself, so sending it again won't help."""
+        return isinstance(error, TransportQueryError) and bool(error.errors)
+
+    @staticmethod
+    def operation_name(document):
+        """Returns the name of the first operation in a parsed document, for latency reporting."""
+        for definition in document.definitions:
+            name = getattr(definition, "name", None)
+            if name is not None:
+                return name.value
+        return "anonymous"
+
+    def latency_summary(self):
+        """Returns a per-operation latency summary, slowest mean first."""
+        ordered = sorted(self.latency.items(), key=lambda item: item[1].mean, reverse=True)
+        return "\n".join(f"{name}: {stats.summary()}" for name, stats in ordered)
+
+    async def _execute(self, document, variables, token):
+        """Executes a document, refreshing a possibly outdated cached schema once if local validation fails."""
         try:
-            return await self.client.execute_async(query, variable_values=variables or {})
+            return await self._send(document, variables, token)
+        except GraphQLError:
+            # Only refetch if the schema wasn't just refreshed, so genuinely invalid documents don't cause a storm
+            if time.monotonic() - self.schema_refreshed_at < 60:
+                raise
+            logger.info("🔄 GraphQL validation failed. Refreshing the schema and retrying...")
+            await self.refresh_schema()
+            return await self._send(document, variables, token)
+
+    async def _send(self, document, variables, token):
+        """Executes a document on the persistent session with the given token, recording its latency."""
+        headers = {"Authorization": f"Bearer {token}"}
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self.breaker.call(self._request, document, variables, headers, is_failure=self.is_backend_failure)
+            outcome = "ok"
+            return result
+        finally:
+            name = self.operation_name(document)
+            elapsed = time.perf_counter() - started
+            self.latency.setdefault(name, LatencyStats()).record(elapsed)
+            GRAPHQL_REQUEST_SECONDS.observe(elapsed, name, outcome)
+
+    async def _request(self, document, variables, headers):
+        return await asyncio.wait_for(
+            self.session.execute(document, variable_values=variables, extra_args={"headers": headers}), self.timeout
+        )
+
+    async def _execute_authenticated(self, document, variables, kind):
+        """Executes a document with the current token, refreshing it and retrying once on a 401."""
+        token = await self.auth_manager.get_jwt_token()
+        try:
+            return await self._execute(document, variables, token)
         except TransportServerError as e:
             if e.code == 401:
-                print("🔄 JWT token expired. Refreshing token and retrying...")
-                await self.auth_manager.refresh()
-                await self.initialize()  # Reinitialize client with new token
-                return await self.client.execute_async(query, variable_values=variables or {})
-            print(f"GraphQL query error: {e}")
+                logger.info("🔄 JWT token expired. Refreshing token and retrying...")
+                # Concurrent 401s for the same token share a single refresh
+                await self.auth_manager.refresh(failed_token=token)
+                return await self._execute(document, variables, await self.auth_manager.get_jwt_token())
+            logger.error(f"GraphQL {kind} error: {e}")
             raise
 
+    async def execute_query(self, query, variables=None):
+        """Executes a GraphQL query, given as a parsed document or a registered operation name, and returns the result.
+
+        Queries are idempotent, so timeouts and server errors are retried with jittered exponential backoff.
+        """
+        return await retry_with_backoff(
+            self._execute_authenticated, get_document(query), variables or {}, "query",
+            retries=self.retries, should_retry=self.is_backend_failure, backend="LLDAP"
+        )
+
     async def execute_mutation(self, mutation, variables):
-        """Executes a GraphQL mutation and returns the result."""
+        """Executes a GraphQL mutation, given as a parsed document or a registered operation name, and returns the result."""
+        return await self._execute_authenticated(get_document(mutation), variables, "mutation")
+
+    def build_mutation_batch(self, calls):
+        """Builds (or reuses) one aliased mutation document for a list of batch calls.
+
+        Each call is a (field, arguments, argument_types, selection) tuple, e.g.
+        ("addUserToGroup", {"userId": "bob", "groupId": 4}, {"userId": "String!", "groupId": "Int!"}, "ok").
+        Returns the parsed document and its variables; call N's result is aliased as `mN`.
+        """
+        signature = tuple((field, tuple(argument_types.items()), selection) for field, _, argument_types, selection in calls)
+        variables = {}
+        for index, (_, arguments, _, _) in enumerate(calls, start=1):
+            for name, value in arguments.items():
+                variables[f"{name}{index}"] = value
+
+        document = self.batch_documents.get(signature)
+        if document is None:
+            declarations = []
+            fields = []
+            for index, (field, _, argument_types, selection) in enumerate(calls, start=1):
+                declarations.extend(f"${name}{index}: {type_}" for name, type_ in argument_types.items())
+                arguments = ", ".join(f"{name}: ${name}{index}" for name in argument_types)
+                fields.append(f"m{index}: {field}({arguments}) {{ {selection} }}")
+            document = gql(f"mutation Batch({', '.join(declarations)}) {{\n" + "\n".join(fields) + "\n}")
+            if len(self.batch_documents) >= 256:
+                self.batch_documents.clear()  # Keep the cache bounded when batch shapes vary a lot
+                self.client.prevalidated -= self.client.validate_once
+                self.client.validate_once.clear()
+            self.batch_documents[signature] = document
+            # Validating a large batch document costs more than sending it, so only do it on first use
+            self.client.validate_once.add(id(document))
+        return document, variables
+
+    async def execute_mutation_batch(self, calls, max_batch_size=50):
+        """Executes many mutations as aliased fields of as few GraphQL requests as possible.
+
+        Returns one entry per call, in order: the field's result, or the exception that call failed with.
+        Batches larger than `max_batch_size`, or rejected by the server as too large, are split automatically.
+        """
+        results = []
+        for start in range(0, len(calls), max_batch_size):
+            results.extend(await self._execute_batch_chunk(calls[start:start + max_batch_size]))
+        return results
+
+    async def _execute_batch_chunk(self, calls):
+        """Sends one batch, mapping aliased results and per-field errors back to their calls."""
+        document, variables = self.build_mutation_batch(calls)
         try:
-            return await self.client.execute_async(mutation, variable_values=variables)
+            data = await self.execute_mutation(document, variables)
+            errors = {}
+        except TransportQueryError as e:
+            # Partial success: fields that errored are reported with their alias as the first path element
+            data = e.data or {}
+            errors = {}
+            for error in e.errors or []:
+                path = error.get("path") if isinstance(error, dict) else None
+                if path:
+                    errors[path[0]] = TransportQueryError(error.get("message", str(error)), errors=[error])
+            if not errors:
+                return [e] * len(calls)
         except TransportServerError as e:
-            if e.code == 401:
-                print("🔄 JWT token expired. Refreshing token and retrying...")
-                await self.auth_manager.refresh()
-                await self.initialize()  # Reinitialize client with new token
-                return await self.client.execute_async(mutation, variable_values=variables)
-            print(f"GraphQL mutation error: {e}")
-            raise
\ No newline at end of file
+            if e.code == 413 and len(calls) > 1:
+                middle = len(calls) // 2
+                return await self._execute_batch_chunk(calls[:middle]) + await self._execute_batch_chunk(calls[middle:])
+            return [e] * len(calls)
+        except Exception as e:
+            return [e] * len(calls)
+
+        results = []
+        for index in range(1, len(calls) + 1):
+            alias = f"m{index}"
+            if alias in errors:
+                results.append(errors[alias])
+            elif data.get(alias) is not None:
+                results.append(data[alias])
+            else:
+                # A failing non-null field can null out the whole batch, leaving the others unconfirmed
+                results.append(TransportQueryError(f"Batched mutation {alias} was not confirmed by the server"))
+        return results
@@ -0,0 +1,85 @@
+from functools import lru_cache
+from gql import gql
+
+# Named LLDAP GraphQL operations. Each document is parsed once at import time and validated
+# once against the schema by GraphQLClient.initialize(), instead of on every request.
+OPERATIONS = {
+    "GetUserByDiscordId": """
+    query GetUserByDiscordId($discordid: String!) {
+        users(filters: { eq: { field: "discordid", value: $discordid } }) {
+            id
+        }
+    }
+    """,
+    "CheckRegistration": """
+    query CheckRegistration($email: String!, $discordid: String!) {
+        byEmail: users(filters: { eq: { field: "email", value: $email } }) {
+            id
+        }
+        byDiscordId: users(filters: { eq: { field: "discordid", value: $discordid } }) {
+            id
+        }
+    }
+    """,
+    "ListUsersWithAttributes": """
+    query ListUsersWithAttributes {
+        users {
+            id
+            email
+            attributes {
+                name
+                value
+            }
+        }
+    }
+    """,
+    "CreateUser": """
+    mutation CreateUser($input: CreateUserInput!) {
+        createUser(user: $input) {
+            id
+        }
+    }
+    """,
+    "AddUserToGroup": """
+    mutation AddUserToGroup($userId: String!, $groupId: Int!) {
+        addUserToGroup(userId: $userId, groupId: $groupId) {
+            ok
+        }
+    }
+    """,
+    "RemoveUserFromGroup": """
+    mutation RemoveUserFromGroup($userId: String!, $groupId: Int!) {
+        removeUserFromGroup(userId: $userId, groupId: $groupId) {
+            ok
+        }
+    }
+    """,
+}
+
+DOCUMENTS = {name: gql(source) for name, source in OPERATIONS.items()}
+
+
+@lru_cache(maxsize=32)
+def group_members_document(group_count):
+    """Returns a parsed query fetching the member IDs of `group_count` groups in one request.
+
+    Variables are named $g0..$gN and each group's result is aliased to the same name. Only user
+    IDs are selected; LLDAP has no way to select a single attribute, so Discord IDs are resolved
+    from the user index instead of transferring every member's attribute list.
+    """
+    declarations = ", ".join(f"$g{index}: Int!" for index in range(group_count))
+    fields = "\n".join(
+        f"g{index}: group(groupId: $g{index}) {{ users {{ id }} }}"
+        for index in range(group_count)
+    )
+    return gql(f"query GetGroupsDetails({declarations}) {{\n{fields}\n}}")
+
+
+def get_document(operation):
+    """Returns the pre-parsed document for a registered operation name, or the operation itself if already parsed."""
+    if isinstance(operation, str):
+        try:
+            return DOCUMENTS[operation]
+        except KeyError:
+            raise KeyError(f"Unknown GraphQL operation: {operation}") from None
+    return operation
@@ -1,28 +1,133 @@
-from ldap3 import Server, Connection, ALL, MODIFY_REPLACE
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from circuit_breaker import CircuitBreaker, CircuitOpenError, retry_with_backoff
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SET_PASSWORD_SECONDS = REGISTRY.histogram("ldap_set_password_seconds", "Latency of LDAP password changes by outcome.", ["outcome"])
 
 class LDAPManager:
     """Handles LDAP operations, such as setting user passwords."""
-    
-    def __init__(self, server_url, bind_dn, bind_password):
+
+    def __init__(self, server_url, bind_dn, bind_password, pool_size=4, connect_timeout=10, timeout=10, retries=2, breaker=None):
         self.server_url = server_url
         self.bind_dn = bind_dn
         self.bind_password = bind_password
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout  # Seconds to wait for the server's answer to a single operation
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker("LDAP")
+        self.server = None  # Created on first use, so ldap3 isn't imported until someone registers
+        # ldap3 connections are blocking, so each worker thread keeps its own bound connection
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="ldap")
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
 
-    def set_password(self, user_dn, new_password):
-        """Sets the LDAP password for a user."""
-        try:
-            server = Server(self.server_url, get_info=ALL)
-            conn = Connection(server, self.bind_dn, self.bind_password, auto_bind=True)
+    def _get_connection(self):
+        """Returns this worker thread's bound connection, opening one if needed."""
+        from ldap3 import Server, Connection, NONE
+        conn = getattr(self.local, "conn", None)
+        if conn is None or conn.closed or not conn.bound:
+            with self.connections_lock:
+                if self.server is None:
+                    # Skip the schema/DSA info read; we only ever issue simple modify operations
+                    self.server = Server(self.server_url, get_info=NONE, connect_timeout=self.connect_timeout)
+            conn = Connection(self.server, self.bind_dn, self.bind_password, auto_bind=True, receive_timeout=self.timeout)
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append(conn)
+        return conn
+
+    def _drop_connection(self):
+        """Unbinds and forgets this worker thread's connection so the next call reconnects."""
+        conn = getattr(self.local, "conn", None)
+        self.local.conn = None
+        if conn is not None:
+            with self.connections_lock:
+                if conn in self.connections:
+                    self.connections.remove(conn)
+            try:
+                conn.unbind()
+            except Exception:
+                pass
+
+    @staticmethod
+    def is_backend_failure(error):
+        """Whether an error means the LDAP server is unreachable or slow, rather than that it rejected the request."""
+        from ldap3.core.exceptions import LDAPCommunicationError, LDAPResponseTimeoutError
+        return isinstance(error, (LDAPCommunicationError, LDAPResponseTimeoutError, OSError, asyncio.TimeoutError))
+
+    def _modify_password(self, user_dn, new_password):
+        """Runs on a worker thread: sets the password, reconnecting once if the pooled connection has gone stale."""
+        from ldap3 import MODIFY_REPLACE
+        from ldap3.core.exceptions import LDAPException
+        for attempt in range(2):
+            # Failing to open or bind a connection is left to set_password's retries
+            conn = self._get_connection()
+            try:
+                conn.modify(user_dn, {'userPassword': [(MODIFY_REPLACE, [new_password])]})
+                return conn.result
+            except LDAPException as e:
+                self._drop_connection()
+                # Result errors won't go away by reconnecting
+                if attempt == 1 or not self.is_backend_failure(e):
+                    raise
 
-            conn.modify(user_dn, {'userPassword': [(MODIFY_REPLACE, [new_password])]})
+    async def _run_modify_password(self, user_dn, new_password):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._modify_password, user_dn, new_password)
 
-            if conn.result['description'] == 'success':
-                print(f"✅ Password set successfully for {user_dn}")
+    async def set_password(self, user_dn, new_password):
+        """Sets the LDAP password for a user without blocking the event loop.
+
+        Replacing a password is idempotent, so connection errors and timeouts are retried with
+        jittered backoff; rejected credentials and other LDAP errors are not. While the LDAP circuit
+        breaker is open this fails immediately.
+        """
+        started = time.perf_counter()
+        try:
+            # Only outages count against the breaker, as for LLDAP; a rejected password says nothing about its health
+            result = await retry_with_backoff(
+                partial(self.breaker.call, is_failure=self.is_backend_failure), self._run_modify_password, user_dn, new_password,
+                retries=self.retries, should_retry=self.is_backend_failure, backend="LDAP"
+            )
+
+            if result['description'] == 'success':
+                SET_PASSWORD_SECONDS.observe(time.perf_counter() - started, "ok")
+                logger.info(f"✅ Password set successfully for {user_dn}")
                 return True
             else:
-                print(f"❌ Failed to set password for {user_dn}: {conn.result['message']}")
+                SET_PASSWORD_SECONDS.observe(time.perf_counter() - started, "rejected")
+                logger.error(f"❌ Failed to set password for {user_dn}: {result['message']}")
                 return False
 
+        except CircuitOpenError as e:
+            SET_PASSWORD_SECONDS.observe(time.perf_counter() - started, "unavailable")
+            logger.error(f"❌ Not setting password for {user_dn}: {e}")
+            return False
+
         except Exception as e:
-            print(f"❌ LDAP Error: {e}")
-            return False
\ No newline at end of file
+            SET_PASSWORD_SECONDS.observe(time.perf_counter() - started, "error")
+            logger.error(f"❌ LDAP Error: {e}")
+            return False
+
+    def _close_connections(self):
+        with self.connections_lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            try:
+                conn.unbind()
+            except Exception:
+                pass
+
+    async def close(self):
+        """Unbinds all pooled connections and stops the worker threads."""
+        self._close_connections()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SYNC_LEADER = REGISTRY.gauge("sync_leader", "1 while this replica holds the sync leader lease, 0 on standby.")
+
+class LeaseBackend(ABC):
+    """Storage for a named lease shared by all replicas. Subclasses must make acquire() atomic."""
+
+    @abstractmethod
+    def acquire(self, name, holder, ttl):
+        """Takes or renews the lease for `ttl` seconds if it is free, expired or already ours. Returns True if held."""
+
+    @abstractmethod
+    def release(self, name, holder):
+        """Gives the lease up early if `holder` still holds it."""
+
+    @abstractmethod
+    def current(self, name):
+        """Returns (holder, expires_at wall clock time) of the lease, or None if it has never been taken."""
+
+    def close(self):
+        pass
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """Lease stored in a SQLite file, for replicas on one host or sharing a local volume."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Lease calls run on worker threads (see LeaderLease), possibly several at once, so they share one lock
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    def acquire(self, name, holder, ttl):
+        now = time.time()
+        with self.lock, self.conn:
+            # A single upsert, so two replicas can never both win an expired lease
+            cursor = self.conn.execute(
+                """
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+                """,
+                (name, holder, now + ttl, now)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, name, holder):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def current(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class LeaderLease:
+    """Keeps trying to hold a named lease so that only one replica acts as the sync leader.
+
+    The leader renews the lease every `ttl / 3` seconds. It only considers itself leader until
+    `ttl` seconds after its last successful renewal started, so a leader that can't renew steps
+    down before the lease can expire for the others. A standby takes over at most
+    `ttl + ttl / 3` seconds after the leader died.
+    """
+
+    def __init__(self, backend, holder_id, ttl=30, name="sync"):
+        self.backend = backend
+        self.holder_id = holder_id
+        self.ttl = ttl
+        self.name = name
+        self.renew_interval = ttl / 3
+        self.valid_until = 0.0  # Monotonic time until which our last renewal guarantees the lease
+        self.was_leader = False
+        self.listeners = []  # Called with True when this replica becomes leader and False when it stops
+        self.task = None
+        SYNC_LEADER.set(0)
+
+    @property
+    def is_leader(self):
+        return time.monotonic() < self.valid_until
+
+    async def current_holder(self):
+        """Returns the ID of the replica holding an unexpired lease, or None."""
+        lease = await asyncio.to_thread(self.backend.current, self.name)
+        return lease[0] if lease and lease[1] > time.time() else None
+
+    async def renew(self):
+        """Tries once to take or renew the lease and notifies listeners if leadership changed."""
+        attempted_at = time.monotonic()
+        try:
+            held = await asyncio.to_thread(self.backend.acquire, self.name, self.holder_id, self.ttl)
+        except Exception as e:
+            logger.error(f"❌ Failed to renew the sync leader lease: {e}")
+            held = False
+        if held:
+            self.valid_until = attempted_at + self.ttl
+        self.notify()
+
+    def notify(self):
+        leader = self.is_leader
+        if leader == self.was_leader:
+            return
+        self.was_leader = leader
+        SYNC_LEADER.set(1 if leader else 0)
+        if leader:
+            logger.info(f"👑 {self.holder_id} is now the sync leader.")
+        else:
+            logger.warning(f"💤 {self.holder_id} is no longer the sync leader; standing by.")
+        for listener in self.listeners:
+            listener(leader)
+
+    async def run(self):
+        """Renews the lease forever; run as a background task."""
+        while True:
+            await self.renew()
+            await asyncio.sleep(self.renew_interval)
+            self.notify()  # Step down on time even if a renewal is slow to come back
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """Stops renewing and releases the lease so a standby can take over immediately."""
+        if self.task is not None:
+            self.task.cancel()
+        if self.is_leader:
+            self.valid_until = 0.0
+            try:
+                await asyncio.to_thread(self.backend.release, self.name, self.holder_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to release the sync leader lease: {e}")
+        self.backend.close()
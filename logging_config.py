@@ -0,0 +1,86 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is a structured field
+STANDARD_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def record_fields(record):
+    """Returns the structured fields attached to a log record via `extra=`."""
+    return {key: value for key, value in vars(record).items() if key not in STANDARD_RECORD_FIELDS}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as one line of text followed by key=value fields, or as one JSON object per line."""
+
+    def __init__(self, json_output=False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record):
+        fields = record_fields(record)
+        if self.json_output:
+            entry = {
+                "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S%z"),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                **fields,
+            }
+            exception = self.exception_text(record)
+            if exception:
+                entry["exception"] = exception
+            return json.dumps(entry, default=str)
+
+        line = f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        exception = self.exception_text(record)
+        if exception:
+            line += "\n" + exception
+        return line
+
+    def exception_text(self, record):
+        """Returns the record's formatted traceback, whether it is still attached or was rendered by LogQueueHandler."""
+        if record.exc_info:
+            return self.formatException(record.exc_info)
+        return record.exc_text
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback out of the message.
+
+    The stock prepare() folds the traceback into `msg` and drops `exc_info`, so the JSON output
+    would never get its "exception" field. Here the message is merged with its arguments and the
+    traceback is rendered into `exc_text` by the thread that logged it, leaving layout to the formatter.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level="INFO", json_output=False):
+    """Routes all logging through a queue so writing to stdout never blocks the event loop.
+
+    Returns the QueueListener doing the actual output; stop() it on shutdown to flush pending records.
+    """
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(StructuredFormatter(json_output))
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers[:] = [LogQueueHandler(log_queue)]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    listener.start()
+    return listener
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke up for the watchdog's timer.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+EVENT_LOOP_STALLS = REGISTRY.counter("event_loop_stalls_total", "Times the event loop was blocked for longer than the threshold.")
+
+class LoopWatchdog:
+    """Measures event loop lag and logs where the loop is stuck when a callback blocks it.
+
+    A task on the loop wakes up every `interval` seconds and records how late it was. A daemon
+    thread watches those wake-ups; once one is more than `threshold` seconds overdue, it samples
+    the loop thread's stack every `threshold / 2` seconds until the loop runs again, then logs
+    the stall with the most frequently sampled stack.
+    """
+
+    def __init__(self, threshold=0.25, interval=0.5, stack_depth=15):
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_depth = stack_depth
+        self.last_tick = time.monotonic()
+        self.loop_thread_id = None
+        self.task = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    async def measure(self):
+        """Runs on the loop: records how late each timer fires."""
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_tick = now
+            EVENT_LOOP_LAG_SECONDS.observe(max(0.0, now - expected))
+
+    def sample_stack(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return None
+        return "".join(traceback.format_stack(frame, limit=self.stack_depth))
+
+    def watch(self):
+        """Runs on the watchdog thread: samples the loop thread's stack while it is stalled."""
+        while not self.stopped.wait(self.threshold / 2):
+            tick = self.last_tick
+            overdue = time.monotonic() - tick - self.interval
+            if overdue < self.threshold:
+                continue
+            samples = Counter()
+            while self.last_tick == tick and not self.stopped.is_set():
+                stack = self.sample_stack()
+                if stack:
+                    samples[stack] += 1
+                self.stopped.wait(self.threshold / 2)
+            blocked_for = time.monotonic() - tick - self.interval
+            EVENT_LOOP_STALLS.inc()
+            if samples:
+                stack, count = samples.most_common(1)[0]
+                logger.warning(
+                    f"🐢 Event loop was blocked for about {blocked_for:.2f}s. Most sampled stack "
+                    f"({count} of {sum(samples.values())} samples):\n{stack}",
+                    extra={"event": "loop_stall", "blocked_for": round(blocked_for, 3)}
+                )
+
+    def start(self):
+        """Starts watching the running event loop."""
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self.task = asyncio.create_task(self.measure())
+        self.thread = threading.Thread(target=self.watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
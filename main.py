@@ -1,59 +1,162 @@
 import asyncio
+import importlib
+import signal
+from contextlib import AsyncExitStack
 from environment_config import EnvironmentConfig
 from auth_manager import AuthManager
-from graphql_client import GraphQLClient
+from circuit_breaker import CircuitBreaker
 from ldap_manager import LDAPManager
+from leader_lease import LeaderLease, SQLiteLeaseBackend
 from user_manager import UserManager
-from subscription_sync import SubscriptionSync
-from discord_bot import DiscordBot
+from mutation_executor import MutationExecutor
+from registration_cache import RegistrationCache
+from logging_config import configure_logging
+from loop_watchdog import LoopWatchdog
+from metrics import REGISTRY, StartupTimer
+from metrics_server import MetricsServer
+from role_index import RoleHolderIndex
+from state_store import StateStore
+from sync_profiler import SyncProfiler
+
+STARTUP_PHASE_SECONDS = REGISTRY.gauge("startup_phase_seconds", "Duration of each phase of the last startup.", ["phase"])
+
+# discord.py, gql and graphql-core take a noticeable time to import, so they are imported in a
+# worker thread while the LLDAP login is already in flight
+DEFERRED_MODULES = ("discord_bot", "graphql_client", "subscription_sync")
+
+def import_deferred_modules():
+    for name in DEFERRED_MODULES:
+        importlib.import_module(name)
 
 async def main():
+    startup = StartupTimer(STARTUP_PHASE_SECONDS)
     # Load environment variables
     config = EnvironmentConfig()
+    log_listener = configure_logging(config.log_level, config.log_json)
 
-    # Extract username from LDAP_BIND_DN
-    ldap_username = config.get_ldap_username()
-
-    # Initialize AuthManager for token-based authentication
-    auth_manager = AuthManager(config.lldap_login_url, ldap_username, config.ldap_bind_password)
-    await auth_manager.initialize()
-
-    # Initialize GraphQL client with AuthManager
-    graphql_client = GraphQLClient(config.lldap_login_url, auth_manager)
-    await graphql_client.initialize()
-
-    # Initialize LDAP manager
-    ldap_manager = LDAPManager(config.ldap_server, config.ldap_bind_dn, config.ldap_bind_password)
-
-    # Initialize user manager
-    user_manager = UserManager(graphql_client, ldap_manager, config.subscribers_group_id, config.ldap_base_dn)
-
-    # Initialize subscription sync with Lifetime parameters
-    subscriptions_sync = SubscriptionSync(
-        None, 
-        user_manager, 
-        config.subscriber_role_name, 
-        config.subscribers_group_id,
-        config.lifetime_role_name,  # Add these from config
-        config.lifetime_group_id
-    )
-
-    # Initialize Discord bot with Lifetime parameters
-    bot = DiscordBot(
-        config.discord_bot_token, 
-        config.subscriber_role_name, 
-        subscriptions_sync, 
-        config.service_name,
-        config.lifetime_role_name,  # Add these from config
-        config.lifetime_group_id
-    )
-    subscriptions_sync.bot = bot.bot  # Set bot instance after initialization
-
-    # Start the bot within the same event loop
-    try:
-        await bot.start(config.lldap_login_url, config.public_url)
-    finally:
-        await auth_manager.close()  # Clean up AuthManager session
+    async with AsyncExitStack() as cleanup:
+        cleanup.callback(log_listener.stop)  # Flush queued log records last
+
+        # Log event loop stalls, with the blocking stack, as early as possible
+        if config.loop_lag_threshold_ms > 0:
+            watchdog = LoopWatchdog(config.loop_lag_threshold_ms / 1000)
+            watchdog.start()
+            cleanup.callback(watchdog.close)
+
+        # Extract username from LDAP_BIND_DN
+        ldap_username = config.get_ldap_username()
+
+        # Log in to LLDAP straight away; everything below runs while the login is in flight
+        auth_manager = AuthManager(
+            config.lldap_login_url, ldap_username, config.ldap_bind_password,
+            renew_before_seconds=config.jwt_renew_before_seconds
+        )
+        cleanup.push_async_callback(auth_manager.close)  # Clean up AuthManager session
+        login = asyncio.create_task(startup.run("lldap_login", auth_manager.initialize()))
+        cleanup.callback(login.cancel)
+
+        await startup.run("imports", asyncio.to_thread(import_deferred_modules))
+        from discord_bot import DiscordBot
+        from graphql_client import GraphQLClient
+        from subscription_sync import SubscriptionSync
+
+        # The GraphQL client needs a token, so it is warmed up (schema cache, connection pool) after login
+        graphql_client = GraphQLClient(
+            config.lldap_login_url, auth_manager,
+            pool_size=config.graphql_pool_size, keepalive_timeout=config.graphql_keepalive_seconds,
+            schema_cache_path=config.schema_cache_path,
+            timeout=config.lldap_timeout, retries=config.lldap_retries,
+            breaker=CircuitBreaker("LLDAP", config.circuit_breaker_failures, config.circuit_breaker_reset_seconds)
+        )
+        cleanup.push_async_callback(graphql_client.close)  # Close the pooled GraphQL session
+
+        async def warm_up_lldap():
+            await login
+            await startup.run("graphql_warmup", graphql_client.initialize())
+
+        # Open the local sync state store (Discord ID index, group snapshot and change outbox)
+        with startup.time("state_store"):
+            state_store = StateStore(config.state_db_path) if config.state_db_path else None
+        if state_store is not None:
+            cleanup.callback(state_store.close)
+
+        # LDAP connections (and the ldap3 import) are only set up when the first password is set
+        ldap_manager = LDAPManager(
+            config.ldap_server, config.ldap_bind_dn, config.ldap_bind_password, pool_size=config.ldap_pool_size,
+            timeout=config.ldap_timeout, retries=config.ldap_retries,
+            breaker=CircuitBreaker("LDAP", config.circuit_breaker_failures, config.circuit_breaker_reset_seconds)
+        )
+        cleanup.push_async_callback(ldap_manager.close)  # Unbind pooled LDAP connections
+
+        # Initialize user manager, with a cache of known emails and Discord IDs for /register
+        registration_cache = RegistrationCache(
+            config.registration_cache_size, config.registration_cache_ttl, config.registration_cache_negative_ttl
+        ) if config.registration_cache_size > 0 else None
+        user_manager = UserManager(
+            graphql_client, ldap_manager, config.ldap_base_dn,
+            discord_id_index_ttl=config.discord_id_index_ttl,
+            state_store=state_store,
+            registration_cache=registration_cache
+        )
+
+        # Initialize subscription sync with the role -> group mapping table
+        subscriptions_sync = SubscriptionSync(
+            None,
+            user_manager,
+            config.role_mappings,
+            mutation_executor=MutationExecutor(config.sync_concurrency, config.sync_rate_limit),
+            batch_size=config.sync_batch_size,
+            role_index=RoleHolderIndex() if config.lean_member_cache else None,
+            state_store=state_store,
+            ldap_refresh_interval=config.ldap_refresh_interval_minutes * 60,
+            max_removals=config.sync_max_removals,
+            max_removal_percent=config.sync_max_removal_percent,
+            profiler=SyncProfiler(config.profile_dir)
+        )
+        if hasattr(signal, "SIGUSR2"):
+            # `kill -USR2 <pid>` profiles the next full sync, like /profile_sync
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGUSR2, subscriptions_sync.profiler.arm)
+            cleanup.callback(loop.remove_signal_handler, signal.SIGUSR2)
+
+        # With several replicas, only the holder of the leader lease runs syncs; all of them answer commands
+        leader_lease = None
+        if config.leader_lease_path:
+            leader_lease = LeaderLease(SQLiteLeaseBackend(config.leader_lease_path), config.replica_id, config.leader_lease_ttl)
+
+        # Initialize Discord bot
+        bot = DiscordBot(
+            config.discord_bot_token,
+            subscriptions_sync,
+            config.service_name,
+            full_sync_interval_minutes=config.full_sync_interval_minutes,
+            event_sync_interval_seconds=config.event_sync_interval_seconds,
+            sharded=config.discord_sharded,
+            shard_count=config.discord_shard_count,
+            lean_member_cache=config.lean_member_cache,
+            sync_debounce_seconds=config.sync_debounce_seconds,
+            leader_lease=leader_lease
+        )
+        subscriptions_sync.bot = bot.bot  # Set bot instance after initialization
+        cleanup.push_async_callback(bot.bot.close)
+
+        if leader_lease is not None:
+            leader_lease.start()
+            cleanup.push_async_callback(leader_lease.close)  # Hand the lease to a standby straight away
+
+        # Serve Prometheus metrics from the same event loop
+        if config.metrics_port:
+            metrics_server = MetricsServer(config.metrics_host, config.metrics_port)
+            await metrics_server.start()
+            cleanup.push_async_callback(metrics_server.close)
+
+        # Connect to the Discord gateway while the LLDAP session warms up; the bot waits for it before syncing
+        lldap_ready = asyncio.create_task(warm_up_lldap())
+        cleanup.callback(lldap_ready.cancel)
+        await asyncio.gather(
+            lldap_ready,
+            bot.start(config.lldap_login_url, config.public_url, lldap_ready=lldap_ready, startup_timer=startup)
+        )
 
 if __name__ == "__main__":
     loop = asyncio.new_event_loop()  # Create a new event loop explicitly
@@ -61,4 +164,4 @@ if __name__ == "__main__":
     try:
         loop.run_until_complete(main())
     finally:
-        loop.close()  # Clean up the loop
\ No newline at end of file
+        loop.close()  # Clean up the loop
@@ -0,0 +1,221 @@
+import bisect
+import time
+from collections import deque
+from contextlib import contextmanager
+
+class LatencyStats:
+    """Keeps a rolling window of latency samples (in seconds) and reports count and percentiles."""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, percent):
+        """Returns the given percentile of the samples in the current window, or 0.0 if empty."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        return (f"n={self.count} mean={self.mean * 1000:.1f}ms "
+                f"p50={self.percentile(50) * 1000:.1f}ms p99={self.percentile(99) * 1000:.1f}ms")
+
+
+class StageTimings:
+    """Tracks LatencyStats for each named stage of a multi-step operation.
+
+    If a Histogram with a single label is given, every stage duration is also observed into it
+    under that stage's name.
+    """
+
+    def __init__(self, histogram=None):
+        self.stages = {}
+        self.histogram = histogram
+
+    @contextmanager
+    def time(self, stage):
+        """Context manager that records how long the wrapped block took under `stage`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages.setdefault(stage, LatencyStats()).record(elapsed)
+            if self.histogram is not None:
+                self.histogram.observe(elapsed, stage)
+
+    def summary(self):
+        return "; ".join(f"{stage}: {stats.summary()}" for stage, stats in self.stages.items())
+
+
+class StartupTimer:
+    """Records how long each (possibly overlapping) startup phase took and when it finished.
+
+    If a Gauge with a single label is given, every phase duration is also set on it under the phase's name.
+    """
+
+    def __init__(self, gauge=None):
+        self.started = time.perf_counter()
+        self.phases = {}  # Phase -> (duration, seconds since startup began when it finished)
+        self.gauge = gauge
+
+    def record(self, phase, duration):
+        self.phases[phase] = (duration, time.perf_counter() - self.started)
+        if self.gauge is not None:
+            self.gauge.set(duration, phase)
+
+    @contextmanager
+    def time(self, phase):
+        """Context manager that records how long the wrapped block took under `phase`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - started)
+
+    async def run(self, phase, awaitable):
+        """Awaits `awaitable`, recording how long it took under `phase`."""
+        with self.time(phase):
+            return await awaitable
+
+    def mark(self, phase):
+        """Records a milestone as a phase that ran from the start of startup until now."""
+        self.record(phase, time.perf_counter() - self.started)
+
+    def summary(self):
+        phases = sorted(self.phases.items(), key=lambda item: item[1][1])
+        return ", ".join(f"{phase} {duration:.2f}s (done at {finished:.2f}s)" for phase, (duration, finished) in phases)
+
+
+def format_labels(label_names, label_values):
+    """Formats label pairs as {name="value",...}, escaping values as Prometheus requires."""
+    if not label_names:
+        return ""
+    pairs = []
+    for name, value in zip(label_names, label_values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """A Prometheus counter, optionally split by label values."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        key = tuple(str(value) for value in label_values)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, format_labels(self.label_names, key), value
+
+
+class Gauge(Counter):
+    """A Prometheus gauge: a value that can go up and down."""
+
+    type = "gauge"
+
+    def set(self, value, *label_values):
+        self.values[tuple(str(label) for label in label_values)] = value
+
+
+class Histogram:
+    """A Prometheus histogram of durations in seconds, optionally split by label values."""
+
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # Label values -> [bucket counts..., sum, count]
+
+    def observe(self, seconds, *label_values):
+        key = tuple(str(value) for value in label_values)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect.bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            entry[index] += 1
+        entry[-2] += seconds
+        entry[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        """Context manager that observes how long the wrapped block took."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def samples(self):
+        label_names = self.label_names + ("le",)
+        for key, entry in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield f"{self.name}_bucket", format_labels(label_names, key + (repr(float(bound)),)), cumulative
+            yield f"{self.name}_bucket", format_labels(label_names, key + ("+Inf",)), entry[-1]
+            yield f"{self.name}_sum", format_labels(self.label_names, key), entry[-2]
+            yield f"{self.name}_count", format_labels(self.label_names, key), entry[-1]
+
+
+class MetricsRegistry:
+    """Holds named metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get_or_create(self, metric_class, name, documentation, label_names, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = metric_class(name, documentation, label_names, **kwargs)
+        elif type(metric) is not metric_class:
+            raise ValueError(f"Metric {name} is already registered as a {metric.type}.")
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=Histogram.DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served on /metrics
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class MutationResult:
+    """Outcome of a single mutation run by the MutationExecutor."""
+
+    def __init__(self, label, result=None, error=None):
+        self.label = label
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ExecutionReport:
+    """Collects per-item results and throughput for one MutationExecutor run."""
+
+    def __init__(self, results, duration):
+        self.results = results
+        self.duration = duration
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def throughput(self):
+        """Completed mutations per second."""
+        return len(self.results) / self.duration if self.duration > 0 else 0.0
+
+    def summary(self):
+        return (f"{len(self.succeeded)} succeeded, {len(self.failed)} failed "
+                f"in {self.duration:.2f}s ({self.throughput:.1f} mutations/s)")
+
+
+class MutationExecutor:
+    """Runs LLDAP mutations with bounded concurrency, optional rate limiting and per-item error capture."""
+
+    def __init__(self, concurrency=10, rate_limit=None):
+        self.concurrency = max(1, concurrency)
+        self.rate_limit = rate_limit  # Max mutations started per second; None or 0 disables limiting
+        self._rate_lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def _wait_for_rate_limit(self):
+        """Spaces out mutation starts so no more than `rate_limit` begin per second."""
+        if not self.rate_limit:
+            return
+        async with self._rate_lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + 1.0 / self.rate_limit
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def run(self, operations):
+        """Runs (label, coroutine_function, args) operations and returns an ExecutionReport.
+
+        A failing operation is recorded in the report and never cancels the others.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(label, func, args):
+            async with semaphore:
+                await self._wait_for_rate_limit()
+                try:
+                    return MutationResult(label, result=await func(*args))
+                except Exception as e:
+                    logger.error(f"❌ Mutation {label} failed: {e}")
+                    return MutationResult(label, error=e)
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(run_one(label, func, args) for label, func, args in operations))
+        return ExecutionReport(list(results), time.monotonic() - started)
+
+    async def run_batches(self, batch_func, items, batch_size=50):
+        """Runs (label, item) pairs through `batch_func` in chunks of `batch_size` and reports per item.
+
+        `batch_func` receives a list of items and returns one outcome per item; an Exception instance
+        marks that item as failed. Batches run concurrently under the same limits as run().
+        """
+        batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+        operations = [
+            (f"batch of {len(batch)}", batch_func, ([item for _, item in batch],))
+            for batch in batches
+        ]
+        batch_report = await self.run(operations)
+
+        results = []
+        for batch, batch_result in zip(batches, batch_report.results):
+            outcomes = batch_result.result if batch_result.ok else [batch_result.error] * len(batch)
+            for (label, _), outcome in zip(batch, outcomes):
+                if isinstance(outcome, Exception):
+                    if batch_result.ok:
+                        logger.error(f"❌ Mutation {label} failed: {outcome}")
+                    results.append(MutationResult(label, error=outcome))
+                else:
+                    results.append(MutationResult(label, result=outcome))
+        return ExecutionReport(results, batch_report.duration)
@@ -0,0 +1,65 @@
+import time
+from collections import OrderedDict
+from metrics import REGISTRY
+
+REGISTRATION_CACHE_LOOKUPS = REGISTRY.counter(
+    "registration_cache_lookups_total", "Registration cache lookups by kind and result (taken, free, miss).", ["kind", "result"]
+)
+
+class RegistrationCache:
+    """Bounded LRU cache of which emails and Discord IDs belong to an LLDAP account.
+
+    Entries are keyed by (kind, value) where kind is "email" or "discord_id". Known accounts
+    ("taken") expire after `ttl` seconds; values LLDAP reported as unused ("free") expire after
+    the much shorter `negative_ttl`, since anyone can register them at any moment. Only "taken"
+    is authoritative enough to act on without asking LLDAP.
+    """
+
+    def __init__(self, max_entries=50000, ttl=600, negative_ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()  # (kind, value) -> (taken, expires_at), least recently used first
+
+    @staticmethod
+    def key(kind, value):
+        return (kind, value.lower() if kind == "email" else str(value))
+
+    def lookup(self, kind, value):
+        """Returns True if the value is known to be taken, False if recently seen free, or None if unknown."""
+        key = self.key(kind, value)
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            REGISTRATION_CACHE_LOOKUPS.inc(kind, "miss")
+            return None
+        self.entries.move_to_end(key)
+        REGISTRATION_CACHE_LOOKUPS.inc(kind, "taken" if entry[0] else "free")
+        return entry[0]
+
+    def record(self, kind, value, taken):
+        """Stores whether a value belongs to an account, evicting the least recently used entries if full."""
+        key = self.key(kind, value)
+        self.entries[key] = (taken, time.monotonic() + (self.ttl if taken else self.negative_ttl))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def add_account(self, email, discord_id):
+        """Write-through for a newly created account."""
+        self.record("email", email, True)
+        self.record("discord_id", discord_id, True)
+
+    def load_snapshot(self, kind, values):
+        """Marks every value from a bulk users query as taken, and forgets taken entries it no longer contains.
+
+        Anything dropped just becomes unknown again, so a concurrent registration missing from the
+        snapshot is re-confirmed against LLDAP rather than wrongly treated as free.
+        """
+        values = {self.key(kind, value)[1] for value in values if value}
+        for key, (taken, _) in list(self.entries.items()):
+            if key[0] == kind and taken and key[1] not in values:
+                del self.entries[key]
+        for value in values:
+            self.record(kind, value, True)
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class GuildRoleIndex:
+    """Compact index of one guild's members that hold mapped roles: member ID -> (role bitset, username).
+
+    Members without any mapped role are not stored at all, so memory grows with role holders
+    rather than with guild size.
+    """
+
+    def __init__(self, role_groups):
+        self.role_groups = role_groups  # Discord role ID -> set of LLDAP group IDs
+        self.role_bits = {role_id: 1 << bit for bit, role_id in enumerate(sorted(role_groups))}
+        self.holders = {}
+
+    def bits_for_role_ids(self, role_ids):
+        bits = 0
+        for role_id in role_ids:
+            bits |= self.role_bits.get(role_id, 0)
+        return bits
+
+    def group_ids(self, bits):
+        """Returns the LLDAP group IDs granted by a role bitset."""
+        group_ids = set()
+        for role_id, bit in self.role_bits.items():
+            if bits & bit:
+                group_ids |= self.role_groups[role_id]
+        return group_ids
+
+    def group_ids_for_member(self, member_id):
+        entry = self.holders.get(member_id)
+        return self.group_ids(entry[0]) if entry else set()
+
+    def update(self, member_id, name, role_ids):
+        """Records a member's current roles. Returns the (old, new) LLDAP group IDs they map to."""
+        old_groups = self.group_ids_for_member(member_id)
+        bits = self.bits_for_role_ids(role_ids)
+        if bits:
+            self.holders[member_id] = (bits, name)
+        else:
+            self.holders.pop(member_id, None)
+        return old_groups, self.group_ids(bits)
+
+    def remove(self, member_id):
+        """Forgets a member who left. Returns the LLDAP group IDs they used to map to."""
+        old_groups = self.group_ids_for_member(member_id)
+        self.holders.pop(member_id, None)
+        return old_groups
+
+    def memberships(self):
+        """Returns the Discord-side membership of every mapped group: group ID -> {discord_id: username}."""
+        discord_groups = {group_id: {} for group_ids in self.role_groups.values() for group_id in group_ids}
+        for member_id, (bits, name) in self.holders.items():
+            for group_id in self.group_ids(bits):
+                discord_groups[group_id][str(member_id)] = name
+        return discord_groups
+
+
+class RoleHolderIndex:
+    """Per-guild role holder indexes, used instead of discord.py's full member cache in lean mode."""
+
+    def __init__(self):
+        self.guilds = {}  # Guild ID -> GuildRoleIndex
+        self.build_locks = {}
+
+    async def ensure_guild(self, guild, role_groups, rebuild=False):
+        """Returns the guild's index, (re)building it by chunking members without caching them if needed.
+
+        With `rebuild`, the index is always rebuilt from a fresh chunk, dropping any drift from
+        member updates missed while the gateway was disconnected.
+        """
+        index = self.guilds.get(guild.id)
+        if not rebuild and index is not None and index.role_groups == role_groups:
+            return index
+        lock = self.build_locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            index = self.guilds.get(guild.id)
+            if rebuild or index is None or index.role_groups != role_groups:
+                index = GuildRoleIndex(role_groups)
+                members = await guild.chunk(cache=False)
+                for member in members:
+                    role_ids = [role_id for role_id in index.role_bits if member.get_role(role_id) is not None]
+                    index.update(member.id, member.name, role_ids)
+                self.guilds[guild.id] = index
+                logger.info(f"📇 Indexed {len(index.holders)} role holders out of {len(members)} members in {guild.name}.")
+        return index
+
+    def get(self, guild_id):
+        return self.guilds.get(guild_id)
@@ -0,0 +1,131 @@
+import json
+
+class RoleGroupMapping:
+    """Maps one Discord role (by name, or by ID if numeric) to one LLDAP group ID."""
+
+    def __init__(self, role, group_id):
+        self.role = str(role)
+        self.group_id = int(group_id)
+
+    @property
+    def role_id(self):
+        """The Discord role ID if the mapping was configured by ID, otherwise None."""
+        return int(self.role) if self.role.isdigit() else None
+
+    def matches(self, role):
+        """Returns True if a discord.Role is the role this mapping refers to."""
+        return role.id == self.role_id if self.role_id is not None else role.name == self.role
+
+    def __repr__(self):
+        return f"RoleGroupMapping({self.role!r} -> {self.group_id})"
+
+
+def parse_role_mappings(spec):
+    """Parses a ROLE_MAPPINGS string such as "Subscriber=4,Lifetime=5" into RoleGroupMappings."""
+    mappings = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        role, separator, group_id = entry.rpartition("=")
+        if not separator or not role.strip() or not group_id.strip().isdigit():
+            raise ValueError(f"Invalid role mapping '{entry}', expected ROLE=GROUP_ID.")
+        mappings.append(RoleGroupMapping(role.strip(), group_id.strip()))
+    return mappings
+
+
+def load_role_mappings_file(path):
+    """Loads role mappings from a JSON file.
+
+    Top-level "mappings" apply to every guild not listed under "guilds", which holds per-guild tables:
+    {"mappings": [{"role": "Subscriber", "group_id": 4}], "guilds": {"1234": {"mappings": [...]}}}
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    def build_table(entries):
+        return RoleMappingTable([RoleGroupMapping(entry["role"], entry["group_id"]) for entry in entries])
+
+    default = build_table(data["mappings"]) if data.get("mappings") else None
+    guilds = {int(guild_id): build_table(guild["mappings"]) for guild_id, guild in data.get("guilds", {}).items()}
+    return GuildRoleMappings(default, guilds)
+
+
+class RoleMappingTable:
+    """A declarative table of Discord role -> LLDAP group mappings.
+
+    Entries are kept in configuration order; when a member holds several mapped roles,
+    the last matching entry names their account type, so list higher tiers last.
+    """
+
+    def __init__(self, mappings):
+        if not mappings:
+            raise ValueError("At least one role -> group mapping must be configured.")
+        self.mappings = list(mappings)
+
+    @property
+    def group_ids(self):
+        """All mapped LLDAP group IDs, sorted."""
+        return sorted({mapping.group_id for mapping in self.mappings})
+
+    @property
+    def role_names(self):
+        return [mapping.role for mapping in self.mappings]
+
+    def is_mapped_role(self, role):
+        return any(mapping.matches(role) for mapping in self.mappings)
+
+    def matching(self, roles):
+        """Returns the mappings matched by a collection of discord.Role objects, in table order."""
+        return [mapping for mapping in self.mappings if any(mapping.matches(role) for role in roles)]
+
+    def group_ids_for_roles(self, roles):
+        """Returns the set of LLDAP group IDs that a collection of discord.Role objects maps to."""
+        return {mapping.group_id for mapping in self.matching(roles)}
+
+    def resolve(self, guild):
+        """Resolves the table against a guild's roles.
+
+        Returns a dict of Discord role ID -> set of LLDAP group IDs for the roles that exist,
+        and the list of mappings whose role could not be found.
+        """
+        role_groups = {}
+        missing = []
+        for mapping in self.mappings:
+            matched = [role for role in guild.roles if mapping.matches(role)]
+            if not matched:
+                missing.append(mapping)
+            for role in matched:
+                role_groups.setdefault(role.id, set()).add(mapping.group_id)
+        return role_groups, missing
+
+    def group_label(self, group_id):
+        """Returns a human readable label for a group, based on the roles mapped to it."""
+        return "/".join(mapping.role for mapping in self.mappings if mapping.group_id == group_id) or str(group_id)
+
+
+class GuildRoleMappings:
+    """Role mapping tables per Discord guild, with an optional default table for guilds not listed."""
+
+    def __init__(self, default=None, guilds=None):
+        self.default = default
+        self.guilds = guilds or {}
+        if self.default is None and not self.guilds:
+            raise ValueError("At least one role -> group mapping must be configured.")
+
+    def for_guild(self, guild_id):
+        """Returns the RoleMappingTable for a guild, or None if the bot doesn't serve that guild."""
+        return self.guilds.get(int(guild_id), self.default)
+
+    @property
+    def tables(self):
+        return [table for table in [self.default, *self.guilds.values()] if table is not None]
+
+    def group_label(self, group_id):
+        """Returns a human readable label for a group, based on the roles mapped to it in any guild."""
+        labels = []
+        for table in self.tables:
+            for mapping in table.mappings:
+                if mapping.group_id == group_id and mapping.role not in labels:
+                    labels.append(mapping.role)
+        return "/".join(labels) or str(group_id)
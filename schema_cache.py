@@ -0,0 +1,52 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+class SchemaCache:
+    """Stores the LLDAP introspection result on disk, keyed by GraphQL URL and schema hash."""
+
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+
+    @staticmethod
+    def schema_hash(introspection):
+        """Returns a stable hash of an introspection result, used as the cached schema's version."""
+        return hashlib.sha256(json.dumps(introspection, sort_keys=True).encode()).hexdigest()
+
+    def load(self):
+        """Returns the cached introspection result for this URL, or None if there is no usable cache."""
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entry = json.load(f)
+            if entry.get("url") != self.url:
+                return None
+            introspection = entry["introspection"]
+            if self.schema_hash(introspection) != entry.get("hash"):
+                logger.warning("⚠️ Cached GraphQL schema is corrupt. Ignoring it.")
+                return None
+            return introspection
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to read cached GraphQL schema: {e}")
+            return None
+
+    def save(self, introspection):
+        """Writes an introspection result to disk atomically. Returns its hash."""
+        schema_hash = self.schema_hash(introspection)
+        if not self.path:
+            return schema_hash
+        entry = {"url": self.url, "hash": schema_hash, "fetched_at": time.time(), "introspection": introspection}
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to write GraphQL schema cache: {e}")
+        return schema_hash
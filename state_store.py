@@ -0,0 +1,221 @@
+import json
+import sqlite3
+import time
+
+class StateStore:
+    """SQLite-backed sync state that survives restarts.
+
+    Holds the Discord ID -> LLDAP user ID mapping, the last known membership of each mapped LLDAP
+    group, and an outbox of group changes that have been planned but not yet applied to LLDAP.
+    Changes that LLDAP rejects, or that still fail after MAX_ATTEMPTS tries, are moved out of the
+    outbox into a dead letter table so they stop being retried.
+    """
+
+    RETRY_BASE_SECONDS = 30
+    RETRY_MAX_SECONDS = 3600
+    MAX_ATTEMPTS = 10
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        discord_id TEXT PRIMARY KEY,
+        lldap_id TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS memberships (
+        group_id INTEGER NOT NULL,
+        discord_id TEXT NOT NULL,
+        lldap_id TEXT NOT NULL,
+        PRIMARY KEY (group_id, discord_id)
+    );
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        group_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        discord_id TEXT NOT NULL,
+        lldap_id TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        UNIQUE (group_id, discord_id)
+    );
+    CREATE TABLE IF NOT EXISTS dead_letters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        group_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        discord_id TEXT NOT NULL,
+        lldap_id TEXT NOT NULL,
+        attempts INTEGER NOT NULL,
+        failed_at REAL NOT NULL,
+        last_error TEXT
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self._set_meta(key, value)
+
+    # Discord ID -> LLDAP user ID mapping
+
+    def load_discord_ids(self):
+        """Returns the stored Discord ID index and the wall clock time it was saved, or (None, None)."""
+        saved_at = self.get_meta("discord_ids_saved_at")
+        if saved_at is None:
+            return None, None
+        return dict(self.conn.execute("SELECT discord_id, lldap_id FROM users")), float(saved_at)
+
+    def save_discord_ids(self, index):
+        """Replaces the stored Discord ID index with a freshly fetched one."""
+        with self.conn:
+            self.conn.execute("DELETE FROM users")
+            self.conn.executemany("INSERT INTO users (discord_id, lldap_id) VALUES (?, ?)", index.items())
+            self._set_meta("discord_ids_saved_at", time.time())
+
+    def set_discord_id(self, discord_id, lldap_id):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO users (discord_id, lldap_id) VALUES (?, ?)", (discord_id, lldap_id))
+
+    # Last known LLDAP group membership
+
+    def snapshot_age(self, group_ids):
+        """Returns how many seconds ago the membership snapshot of these groups was taken, or None if any is missing."""
+        refreshed_at = self.get_meta("memberships_refreshed_at")
+        snapshot_group_ids = set(json.loads(self.get_meta("memberships_group_ids") or "[]"))
+        if refreshed_at is None or not set(group_ids) <= snapshot_group_ids:
+            return None
+        return time.time() - float(refreshed_at)
+
+    def load_memberships(self, group_ids):
+        """Returns the stored membership of each group: group ID -> {discord_id: lldap_id}."""
+        memberships = {group_id: {} for group_id in group_ids}
+        placeholders = ", ".join("?" for _ in group_ids)
+        rows = self.conn.execute(
+            f"SELECT group_id, discord_id, lldap_id FROM memberships WHERE group_id IN ({placeholders})", list(group_ids)
+        )
+        for group_id, discord_id, lldap_id in rows:
+            memberships[group_id][discord_id] = lldap_id
+        return memberships
+
+    def save_memberships(self, memberships):
+        """Replaces the snapshot with freshly fetched membership: group ID -> {discord_id: lldap_id}."""
+        with self.conn:
+            self.conn.execute("DELETE FROM memberships")
+            for group_id, members in memberships.items():
+                self.conn.executemany(
+                    "INSERT INTO memberships (group_id, discord_id, lldap_id) VALUES (?, ?, ?)",
+                    ((group_id, discord_id, lldap_id) for discord_id, lldap_id in members.items())
+                )
+            self._set_meta("memberships_refreshed_at", time.time())
+            self._set_meta("memberships_group_ids", json.dumps(sorted(memberships)))
+
+    def invalidate_snapshot(self):
+        """Marks the membership snapshot as stale so the next full sync re-reads LLDAP."""
+        with self.conn:
+            self.conn.execute("DELETE FROM meta WHERE key = 'memberships_refreshed_at'")
+
+    # Outbox of group changes waiting to be applied
+
+    def enqueue(self, changes):
+        """Adds (group_id, action, discord_id, lldap_id) changes to the outbox.
+
+        Only the latest intent per member and group is kept; a change that repeats an already
+        queued action keeps its retry schedule.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO outbox (group_id, action, discord_id, lldap_id, next_attempt_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (group_id, discord_id) DO UPDATE SET
+                    lldap_id = excluded.lldap_id,
+                    attempts = CASE WHEN outbox.action = excluded.action THEN outbox.attempts ELSE 0 END,
+                    next_attempt_at = CASE WHEN outbox.action = excluded.action THEN outbox.next_attempt_at ELSE excluded.next_attempt_at END,
+                    last_error = CASE WHEN outbox.action = excluded.action THEN outbox.last_error ELSE NULL END,
+                    action = excluded.action
+                """,
+                ((group_id, action, discord_id, lldap_id, now) for group_id, action, discord_id, lldap_id in changes)
+            )
+
+    def due_changes(self, now=None):
+        """Returns outbox rows ready to be (re)tried as (group_id, action, discord_id, lldap_id) tuples."""
+        now = time.time() if now is None else now
+        return self.conn.execute(
+            "SELECT group_id, action, discord_id, lldap_id FROM outbox WHERE next_attempt_at <= ? ORDER BY id", (now,)
+        ).fetchall()
+
+    def pending_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def dead_letter_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def complete(self, changes):
+        """Removes applied changes from the outbox (if queued there) and records them in the membership snapshot."""
+        with self.conn:
+            for group_id, action, discord_id, lldap_id in changes:
+                self.conn.execute(
+                    "DELETE FROM outbox WHERE group_id = ? AND discord_id = ? AND action = ?", (group_id, discord_id, action)
+                )
+                if action == "add":
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO memberships (group_id, discord_id, lldap_id) VALUES (?, ?, ?)",
+                        (group_id, discord_id, lldap_id)
+                    )
+                else:
+                    self.conn.execute("DELETE FROM memberships WHERE group_id = ? AND discord_id = ?", (group_id, discord_id))
+
+    def fail(self, changes, error, permanent=False):
+        """Schedules failed changes for another attempt with exponential backoff.
+
+        Permanent failures, and changes that have used up MAX_ATTEMPTS, are dead-lettered instead.
+        Returns the number of changes dead-lettered.
+        """
+        now = time.time()
+        dead_lettered = 0
+        with self.conn:
+            for group_id, action, discord_id, lldap_id in changes:
+                row = self.conn.execute(
+                    "SELECT attempts FROM outbox WHERE group_id = ? AND discord_id = ? AND action = ?",
+                    (group_id, discord_id, action)
+                ).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                if permanent or attempts >= self.MAX_ATTEMPTS:
+                    self.conn.execute(
+                        "INSERT INTO dead_letters (group_id, action, discord_id, lldap_id, attempts, failed_at, last_error) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (group_id, action, discord_id, lldap_id, attempts, now, str(error))
+                    )
+                    self.conn.execute(
+                        "DELETE FROM outbox WHERE group_id = ? AND discord_id = ? AND action = ?", (group_id, discord_id, action)
+                    )
+                    dead_lettered += 1
+                    continue
+                delay = min(self.RETRY_BASE_SECONDS * 2 ** (attempts - 1), self.RETRY_MAX_SECONDS)
+                self.conn.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? "
+                    "WHERE group_id = ? AND discord_id = ? AND action = ?",
+                    (attempts, now + delay, str(error), group_id, discord_id, action)
+                )
+        return dead_lettered
+
+    def close(self):
+        self.conn.close()
@@ -1,117 +1,453 @@
-import discord
-from gql import gql
+import asyncio
+import logging
+import time
+from graphql_operations import group_members_document
+from metrics import REGISTRY, StageTimings
+from mutation_executor import MutationExecutor
+from sync_plan import GroupDiff, SyncPlan
+from sync_profiler import SyncProfiler
+
+logger = logging.getLogger(__name__)
+
+SYNC_PHASE_SECONDS = REGISTRY.histogram("sync_phase_seconds", "Time spent in each phase of a full sync.", ["phase"])
+SYNC_CHANGES = REGISTRY.counter(
+    "sync_group_changes_total", "LLDAP group membership changes applied, by source, action and outcome.", ["source", "action", "outcome"]
+)
+SYNC_PLANNED_CHANGES = REGISTRY.gauge("sync_planned_changes", "Group changes planned by the last full sync, by action.", ["action"])
+SYNC_LAST_SUCCESS = REGISTRY.gauge("sync_last_success_timestamp_seconds", "Unix time at which the last full sync finished.")
+OUTBOX_PENDING = REGISTRY.gauge("sync_outbox_pending_changes", "Group changes waiting in the state store outbox.")
+OUTBOX_DEAD_LETTERS = REGISTRY.gauge("sync_outbox_dead_letters", "Group changes given up on and moved to the dead letter table.")
 
 class SubscriptionSync:
-    """Handles syncing Discord roles with LLDAP Subscribers and Lifetime groups."""
+    """Handles syncing Discord roles with LLDAP groups according to a role -> group mapping table."""
     
-    def __init__(self, bot, user_manager, subscriber_role_name, subscribers_group_id, lifetime_role_name, lifetime_group_id):
+    def __init__(self, bot, user_manager, role_mappings, mutation_executor=None, batch_size=50, role_index=None,
+                 state_store=None, ldap_refresh_interval=86400, max_removals=50, max_removal_percent=25, profiler=None):
         self.bot = bot
         self.user_manager = user_manager
-        self.subscriber_role_name = subscriber_role_name
-        self.subscribers_group_id = subscribers_group_id
-        self.lifetime_role_name = lifetime_role_name
-        self.lifetime_group_id = lifetime_group_id
+        self.role_mappings = role_mappings  # GuildRoleMappings
+        self.pending_changes = {}  # Discord ID -> {"add": set(), "remove": set()} of LLDAP group IDs
+        self.full_sync_requested = False
+        self.full_sync_refresh = False  # Whether the requested full sync must re-read LLDAP instead of the snapshot
+        # Held by full syncs and by the event/outbox path, so their plans and LLDAP writes never interleave
+        self.apply_lock = asyncio.Lock()
+        self.mutation_executor = mutation_executor or MutationExecutor()
+        self.batch_size = batch_size  # Group membership mutations merged into one GraphQL request
+        self.role_index = role_index  # RoleHolderIndex when running without the full member cache
+        self.role_index_stale = False  # Set when the index may have missed member updates; the next plan re-chunks
+        self.state_store = state_store  # StateStore holding the membership snapshot and change outbox
+        self.ldap_refresh_interval = ldap_refresh_interval  # Max snapshot age (seconds) before LLDAP is re-read
+        self.sync_timings = StageTimings(SYNC_PHASE_SECONDS)
+        # A full sync holds back a group's removals when they exceed both of these limits
+        self.max_removals = max_removals
+        self.max_removal_percent = max_removal_percent
+        self.profiler = profiler or SyncProfiler()  # Profiles the next full sync once armed
+
+    def group_ids_for_roles(self, guild_id, roles):
+        """Returns the LLDAP group IDs that a collection of Discord roles in a guild maps to."""
+        table = self.role_mappings.for_guild(guild_id)
+        return table.group_ids_for_roles(roles) if table else set()
+
+    def granted_group_ids(self, discord_id):
+        """Returns the LLDAP groups a user's current roles grant across every guild the bot serves."""
+        group_ids = set()
+        if self.role_index is not None:
+            for index in self.role_index.guilds.values():
+                group_ids |= index.group_ids_for_member(int(discord_id))
+            return group_ids
+        for guild in self.bot.guilds:
+            member = guild.get_member(int(discord_id))
+            if member is not None:
+                group_ids |= self.group_ids_for_roles(guild.id, member.roles)
+        return group_ids
+
+    def queue_member_change(self, discord_id, added_group_ids, removed_group_ids):
+        """Merges a per-member group diff into the pending queue, keeping only the latest intent per group."""
+        if not (added_group_ids or removed_group_ids):
+            return
+        change = self.pending_changes.setdefault(str(discord_id), {"add": set(), "remove": set()})
+        for group_id in added_group_ids:
+            change["remove"].discard(group_id)
+            change["add"].add(group_id)
+        for group_id in removed_group_ids:
+            change["add"].discard(group_id)
+            change["remove"].add(group_id)
+
+    def requeue_member_change(self, discord_id, change):
+        """Puts back a change that could not be applied, without overriding newer events for the same groups."""
+        newer = self.pending_changes.get(discord_id)
+        if newer is None:
+            self.pending_changes[discord_id] = change
+            return
+        decided = newer["add"] | newer["remove"]
+        newer["add"] |= change["add"] - decided
+        newer["remove"] |= change["remove"] - decided
+
+    def queue_member_update(self, before, after):
+        """Queues the group changes caused by a Discord member's roles changing."""
+        before_groups = self.group_ids_for_roles(after.guild.id, before.roles)
+        after_groups = self.group_ids_for_roles(after.guild.id, after.roles)
+        self.queue_member_change(after.id, after_groups - before_groups, before_groups - after_groups)
+
+    def queue_member_remove(self, member):
+        """Queues removal from every mapped group for a member who left a server."""
+        self.queue_member_change(member.id, set(), self.group_ids_for_roles(member.guild.id, member.roles))
+
+    def handle_raw_member_update(self, guild_id, member_id, name, role_ids):
+        """Updates the role holder index from a raw member update and queues the resulting group changes."""
+        index = self.role_index.get(guild_id) if self.role_index is not None else None
+        if index is None:
+            return  # Not indexed yet; the next full sync builds the index from current roles
+        old_groups, new_groups = index.update(member_id, name, role_ids)
+        self.queue_member_change(member_id, new_groups - old_groups, old_groups - new_groups)
+
+    def queue_raw_member_remove(self, guild_id, member_id):
+        """Queues removal from every mapped group for an uncached member who left a server."""
+        index = self.role_index.get(guild_id) if self.role_index is not None else None
+        if index is not None:
+            self.queue_member_change(member_id, set(), index.remove(member_id))
+
+    def queue_role_change(self, role):
+        """Requests a full sync when a mapped role is deleted or renamed, as Discord sends no per-member events for it."""
+        table = self.role_mappings.for_guild(role.guild.id)
+        if table and table.is_mapped_role(role):
+            logger.warning(f"⚠️ Mapped role '{role.name}' was changed or deleted in {role.guild.name}. Scheduling a full sync...")
+            self.full_sync_requested = True
+
+    async def apply_pending_changes(self, full_sync=None):
+        """Applies queued per-member group changes, or runs a full sync if one was requested.
+
+        `full_sync` is the coroutine function used for a requested full sync, defaulting to sync().
+        """
+        if self.lldap_retry_after():
+            return  # LLDAP is unhealthy; queued changes wait until its circuit breaker allows a probe
+        if self.full_sync_requested:
+            refresh = self.full_sync_refresh
+            self.full_sync_requested = self.full_sync_refresh = False
+            self.pending_changes.clear()
+            await (full_sync or self.sync)(refresh=refresh)
+            return
+        # Waits out a running full sync; events that arrive meanwhile are newer than its plan and go after it
+        async with self.apply_lock:
+            await self.apply_queued_changes()
+
+    async def apply_queued_changes(self):
+        """Sends queued per-member group changes, or retries due outbox changes if none are queued. Call with apply_lock held."""
+        if not self.pending_changes:
+            # Retry outbox changes that failed earlier or were left over from before a restart
+            if self.state_store is not None and self.state_store.due_changes():
+                report = await self.drain_outbox()
+                self.record_report("retry", report)
+                logger.info(f"🔁 Retried queued LLDAP changes: {report.summary()}")
+            return
+
+        pending, self.pending_changes = self.pending_changes, {}
+        operations = []
+        for discord_id, change in pending.items():
+            try:
+                lldap_user_id = await self.user_manager.resolve_discord_id(discord_id)
+                if not lldap_user_id:
+                    continue  # Member has not registered an LLDAP account yet
+                # A group lost in one guild may still be granted by a role in another guild
+                if change["remove"]:
+                    change["remove"] -= self.granted_group_ids(discord_id)
+            except Exception as e:
+                # Keep the change queued for the next run rather than waiting hours for the full sync
+                logger.error(f"❌ Failed to resolve LLDAP user for {discord_id}, will retry: {e}")
+                self.requeue_member_change(discord_id, change)
+                continue
+            for group_id in change["add"]:
+                logger.info(f"🟢 Adding {lldap_user_id} ({discord_id}) to group {group_id} after a role change...")
+                operations.append(((group_id, "add", discord_id), ("add", lldap_user_id, group_id)))
+            for group_id in change["remove"]:
+                logger.info(f"🚨 Removing {lldap_user_id} ({discord_id}) from group {group_id} after a role change...")
+                operations.append(((group_id, "remove", discord_id), ("remove", lldap_user_id, group_id)))
+
+        if operations:
+            report = await self.execute_operations(operations)
+            self.record_report("event", report)
+            logger.info(f"🔄 Applied queued role changes: {report.summary()}")
+
+    def lldap_retry_after(self):
+        """Seconds until LLDAP may be called again: 0 unless its circuit breaker is open."""
+        breaker = self.user_manager.graphql_client.breaker
+        return 0.0 if breaker.allows_request() else max(breaker.retry_after, 1.0)
+
+    async def fetch_ldap_groups(self, group_ids, discord_id_index):
+        """Fetches the members of several LLDAP groups in one request.
+
+        Only member IDs are requested; they are mapped back to Discord IDs through the Discord ID
+        index, which already holds every user's discordid attribute. Returns a dict of
+        group ID -> {discord_id: lldap_user_id} for members that have a Discord ID.
+        """
+        variables = {f"g{index}": group_id for index, group_id in enumerate(group_ids)}
+        result = await self.user_manager.graphql_client.execute_query(group_members_document(len(group_ids)), variables)
+
+        lldap_to_discord = {lldap_user_id: discord_id for discord_id, lldap_user_id in discord_id_index.items()}
+        ldap_groups = {}
+        for index, group_id in enumerate(group_ids):
+            ldap_users = {}
+            group = result.get(f"g{index}") or {}
+            for user in group.get("users") or []:
+                discord_id = lldap_to_discord.get(user["id"])
+                if discord_id:
+                    ldap_users[discord_id] = user["id"]
+            ldap_groups[group_id] = ldap_users
+        return ldap_groups
 
     @staticmethod
-    def get_attribute_value(attributes, name):
-        """Extracts attribute value by name from LLDAP user attributes."""
-        for attr in attributes:
-            if attr['name'] == name:
-                return attr['value'][0] if attr['value'] else None
-        return None
-
-    async def fetch_ldap_users_in_group(self, group_id):
-        """Fetches all users in a specified LLDAP group."""
-        query = gql("""
-        query GetGroupDetails($id: Int!) {
-            group(groupId: $id) {
-                users {
-                    id
-                    displayName
-                    attributes {
-                        name
-                        value
-                    }
-                }
-            }
+    async def scan_discord_members(guild, role_groups):
+        """Computes the Discord-side membership of every mapped group in a single pass over a guild's members.
+
+        `role_groups` maps Discord role IDs to the LLDAP group IDs they grant. Returns a dict of
+        group ID -> {discord_id: username}. Yields to the event loop periodically on large guilds.
+        """
+        discord_groups = {group_id: {} for group_ids in role_groups.values() for group_id in group_ids}
+        mapped_roles = list(role_groups.items())
+        for index, member in enumerate(guild.members):
+            if index and index % 5000 == 0:
+                await asyncio.sleep(0)
+            for role_id, group_ids in mapped_roles:
+                if member.get_role(role_id) is not None:
+                    discord_id = str(member.id)
+                    for group_id in group_ids:
+                        discord_groups[group_id][discord_id] = member.name
+        return discord_groups
+
+    async def execute_operations(self, operations):
+        """Applies planned ((group_id, action, discord_id), (action, lldap_id, group_id)) operations.
+
+        With a state store the operations go through the persistent outbox first, so failures are
+        retried with backoff and nothing planned is lost if the bot stops mid-sync.
+        """
+        if self.state_store is None:
+            return await self.mutation_executor.run_batches(self.apply_group_changes, operations, self.batch_size)
+        self.state_store.enqueue(
+            (group_id, action, discord_id, lldap_user_id)
+            for (group_id, action, discord_id), (_, lldap_user_id, _) in operations
+        )
+        return await self.drain_outbox()
+
+    @staticmethod
+    def record_report(source, report):
+        """Counts the applied and failed group changes of an ExecutionReport in the metrics registry."""
+        for result in report.results:
+            _, action, _ = result.label
+            SYNC_CHANGES.inc(source, action, "ok" if result.ok else "error")
+
+    async def drain_outbox(self):
+        """Sends every due outbox change to LLDAP and records the outcome in the state store."""
+        changes = self.state_store.due_changes()
+        operations = [
+            ((group_id, action, discord_id), (action, lldap_user_id, group_id))
+            for group_id, action, discord_id, lldap_user_id in changes
+        ]
+        report = await self.mutation_executor.run_batches(self.apply_group_changes, operations, self.batch_size)
+        by_label = {change[:3]: change for change in changes}  # (group_id, action, discord_id) -> outbox row
+        self.state_store.complete(by_label[result.label] for result in report.succeeded)
+        rejected = 0
+        for result in report.failed:
+            # Changes LLDAP rejected (unknown user, already a member, ...) would fail the same way forever
+            permanent = self.user_manager.graphql_client.is_rejected(result.error)
+            rejected += permanent
+            dead_lettered = self.state_store.fail([by_label[result.label]], result.error, permanent=permanent)
+            if dead_lettered:
+                group_id, action, discord_id = result.label
+                logger.error(f"🪦 Giving up on {action} of {discord_id} in group {group_id}: {result.error}")
+        if rejected:
+            # A rejected change usually means the snapshot disagrees with LLDAP, so re-read it on the next full sync
+            self.state_store.invalidate_snapshot()
+        OUTBOX_PENDING.set(self.state_store.pending_count())
+        OUTBOX_DEAD_LETTERS.set(self.state_store.dead_letter_count())
+        if report.failed:
+            logger.warning(f"⏳ {len(report.failed)} LLDAP changes failed; {self.state_store.pending_count()} waiting in the outbox.")
+        return report
+
+    def ldap_snapshot_is_fresh(self, group_ids):
+        """Returns True if the local membership snapshot of these groups can stand in for reading LLDAP."""
+        if self.state_store is None:
+            return False
+        age = self.state_store.snapshot_age(group_ids)
+        return age is not None and age < self.ldap_refresh_interval
+
+    async def load_ldap_groups(self, group_ids, discord_id_index, refresh):
+        """Returns group ID -> {discord_id: lldap_user_id}, read from LLDAP if `refresh` else from the local snapshot.
+
+        Reading LLDAP also refreshes the snapshot and reports any drift from what was last recorded.
+        """
+        if not refresh:
+            return self.state_store.load_memberships(group_ids)
+
+        logger.info("🔍 Fetching users from LLDAP...")
+        ldap_groups = await self.fetch_ldap_groups(group_ids, discord_id_index)
+        if self.state_store is not None:
+            if self.state_store.snapshot_age(group_ids) is not None:
+                snapshot = self.state_store.load_memberships(group_ids)
+                for group_id in group_ids:
+                    drifted = set(snapshot[group_id].items()) ^ set(ldap_groups[group_id].items())
+                    if drifted:
+                        logger.warning(f"⚠️ LLDAP group {self.role_mappings.group_label(group_id)} drifted from the local snapshot by {len(drifted)} entries.")
+            self.state_store.save_memberships(ldap_groups)
+        return ldap_groups
+
+    async def discord_memberships(self, guild, role_groups, rebuild_index=False):
+        """Returns group ID -> {discord_id: username} for a guild, from the role holder index when one is used.
+
+        `rebuild_index` re-chunks the guild instead of trusting the event-maintained index.
+        """
+        if self.role_index is not None:
+            index = await self.role_index.ensure_guild(guild, role_groups, rebuild=rebuild_index)
+            return index.memberships()
+        return await self.scan_discord_members(guild, role_groups)
+
+    async def apply_group_changes(self, changes):
+        """Sends one batch of (action, user_id, group_id) changes as a single GraphQL request."""
+        return await self.user_manager.apply_group_changes(changes, max_batch_size=self.batch_size)
+
+    def diff_group(self, group_id, ldap_users, discord_members, discord_id_index, allow_removals=True):
+        """Computes the GroupDiff that makes an LLDAP group match the holders of its Discord roles.
+
+        Works on sets of Discord IDs only; role holders are resolved to LLDAP users through the
+        prefetched index, so no per-user requests are made.
+        """
+        ldap_ids = ldap_users.keys()
+        discord_ids = discord_members.keys()
+        # Users in the LLDAP group without a mapped Discord role lose access
+        removes = tuple(sorted((discord_id, ldap_users[discord_id]) for discord_id in ldap_ids - discord_ids)) if allow_removals else ()
+        # Role holders missing from the group are added if they have an LLDAP account
+        missing = discord_ids - ldap_ids
+        adds = tuple(sorted((discord_id, discord_id_index[discord_id]) for discord_id in missing if discord_id in discord_id_index))
+        unresolved = frozenset(discord_id for discord_id in missing if discord_id not in discord_id_index)
+        return GroupDiff(group_id, self.role_mappings.group_label(group_id), len(ldap_users), adds, removes, unresolved, allow_removals)
+
+    def guarded_groups(self, plan):
+        """Returns the IDs of groups whose planned removals exceed the removal guard."""
+        return {
+            group.group_id for group in plan.groups
+            if len(group.removes) > self.max_removals
+            and len(group.removes) > group.current_size * self.max_removal_percent / 100
         }
-        """)
-        result = await self.user_manager.graphql_client.execute_query(query, {"id": group_id})
 
-        ldap_users = {}
-        if result.get("group") and result["group"].get("users"):
-            for user in result["group"]["users"]:
-                discord_id = self.get_attribute_value(user["attributes"], "discordid")
-                if discord_id:
-                    ldap_users[discord_id] = user
-        return ldap_users
-
-    async def sync(self):
-        """Syncs Discord Subscribers and Lifetime roles with LLDAP group membership."""
-        guild = self.bot.guilds[0]  # Assuming bot is only in one server
-        subscriber_role = discord.utils.get(guild.roles, name=self.subscriber_role_name)
-        lifetime_role = discord.utils.get(guild.roles, name=self.lifetime_role_name)
-
-        if not subscriber_role:
-            print("⚠️ Subscriber role not found!")
-        if not lifetime_role:
-            print("⚠️ Lifetime role not found!")
-        if not (subscriber_role or lifetime_role):
-            return
+    def resolve_guilds(self):
+        """Returns (guild, role_groups) for every guild with at least one mapped role that exists."""
+        guild_roles = []
+        for guild in self.bot.guilds:
+            table = self.role_mappings.for_guild(guild.id)
+            if table is None:
+                continue
+            role_groups, missing = table.resolve(guild)
+            for mapping in missing:
+                logger.warning(f"⚠️ Role '{mapping.role}' not found in {guild.name}!")
+            if role_groups:
+                guild_roles.append((guild, role_groups))
+        return guild_roles
+
+    async def plan(self, refresh=False):
+        """Computes a SyncPlan for every mapped Discord role, across all guilds, without changing anything.
+
+        With a state store, LLDAP is only re-read once the local snapshot is older than
+        `ldap_refresh_interval`, or when `refresh` is True.
+        """
+        guild_roles = self.resolve_guilds()
+        if not guild_roles:
+            return SyncPlan((), False)
+
+        # Only groups with at least one existing role are synced, so a missing role never empties its group
+        group_ids = sorted({group_id for _, role_groups in guild_roles for group_ids in role_groups.values() for group_id in group_ids})
+
+        # Resolve Discord IDs from one bulk users query instead of a lookup per member. A sync that
+        # re-reads LLDAP also rebuilds the index; otherwise it is reused until it expires.
+        refresh = refresh or not self.ldap_snapshot_is_fresh(group_ids)
+        with self.sync_timings.time("fetch_ldap"):
+            discord_id_index = await self.user_manager.get_discord_id_index(refresh=refresh)
+
+            # Load every mapped LLDAP group once, shared by all guilds that map to it
+            ldap_groups = await self.load_ldap_groups(group_ids, discord_id_index, refresh)
+        for group_id in group_ids:
+            logger.info(f"📜 Found {len(ldap_groups[group_id])} LLDAP users in group {self.role_mappings.group_label(group_id)}.")
+
+        # Scan each guild's members concurrently; a failing guild doesn't stop the others
+        rebuild_index, self.role_index_stale = self.role_index_stale, False
+        with self.sync_timings.time("scan_discord"):
+            scans = await asyncio.gather(
+                *(self.discord_memberships(guild, role_groups, rebuild_index) for guild, role_groups in guild_roles),
+                return_exceptions=True
+            )
+        if rebuild_index and any(isinstance(scan, Exception) for scan in scans):
+            self.role_index_stale = True  # Try the rebuild again next time
+        discord_groups = {group_id: {} for group_id in group_ids}
+        incomplete_group_ids = set()
+        for (guild, role_groups), scan in zip(guild_roles, scans):
+            if isinstance(scan, Exception):
+                logger.error(f"❌ Failed to scan members of {guild.name}: {scan}")
+                # Without this guild's view we can't tell who should lose access, so only add to its groups
+                incomplete_group_ids.update(group_id for group_ids in role_groups.values() for group_id in group_ids)
+                continue
+            for group_id, members in scan.items():
+                discord_groups[group_id].update(members)
+        for group_id in group_ids:
+            logger.info(f"🔍 Found {len(discord_groups[group_id])} Discord users with the {self.role_mappings.group_label(group_id)} role.")
+
+        with self.sync_timings.time("plan"):
+            plan = SyncPlan(tuple(
+                self.diff_group(group_id, ldap_groups[group_id], discord_groups[group_id], discord_id_index,
+                                allow_removals=group_id not in incomplete_group_ids)
+                for group_id in group_ids
+            ), refresh)
+        SYNC_PLANNED_CHANGES.set(plan.add_count, "add")
+        SYNC_PLANNED_CHANGES.set(plan.remove_count, "remove")
+        return plan
+
+    async def apply(self, plan, force=False):
+        """Applies a SyncPlan as batched mutations and returns the ExecutionReport.
+
+        Removals in groups that trip the removal guard are held back unless `force` is True.
+        """
+        guarded = set() if force else self.guarded_groups(plan)
+        for group in plan.groups:
+            if group.group_id in guarded:
+                logger.warning(f"🛑 Refusing to remove {len(group.removes)} of {group.current_size} users from LLDAP group "
+                               f"{group.label}; run /sync_subscribers with force to apply them.")
+                continue
+            for discord_id, lldap_user_id in group.removes:
+                logger.info(f"🚨 User {lldap_user_id} ({discord_id}) is in LLDAP group {group.label} but does NOT have the Discord role! Removing from group...")
+        for group in plan.groups:
+            for discord_id, lldap_user_id in group.adds:
+                logger.info(f"🟢 User {lldap_user_id} ({discord_id}) has the Discord {group.label} role but is NOT in LLDAP! Adding to group...")
+
+        operations = plan.operations(skip_removals_for=guarded)
+        with self.sync_timings.time("apply"):
+            report = await self.execute_operations(operations)
+        self.record_report("full_sync", report)
+        SYNC_LAST_SUCCESS.set(time.time())
+        return report
+
+    async def sync(self, refresh=False, dry_run=False, force=False):
+        """Plans and applies a full sync of every mapped Discord role with its LLDAP group membership.
+
+        With `dry_run` the plan is only computed and logged. Returns (plan, report); report is None for a dry run.
+        """
+        started = time.monotonic()
+        async with self.apply_lock, self.profiler.profile_if_armed():
+            with self.sync_timings.time("total"):
+                plan = await self.plan(refresh)
+                if dry_run:
+                    logger.info(f"📝 Dry run plan: {plan.summary()}")
+                    return plan, None
+                report = await self.apply(plan, force)
 
-        # Fetch LDAP users for both groups
-        print("🔍 Fetching users from LLDAP...")
-        subscriber_ldap_users = await self.fetch_ldap_users_in_group(self.subscribers_group_id)
-        lifetime_ldap_users = await self.fetch_ldap_users_in_group(self.lifetime_group_id)
-        print(f"📜 Found {len(subscriber_ldap_users)} LLDAP users in the 'Subscribers' group.")
-        print(f"📜 Found {len(lifetime_ldap_users)} LLDAP users in the 'Lifetime' group.")
-
-        # Get Discord users with each role, mapping ID to username
-        discord_subscribers = {str(member.id): member.name for member in guild.members if subscriber_role and subscriber_role in member.roles}
-        discord_lifetime = {str(member.id): member.name for member in guild.members if lifetime_role and lifetime_role in member.roles}
-        print(f"🔍 Found {len(discord_subscribers)} Discord users with the 'Subscribers' role.")
-        print(f"🔍 Found {len(discord_lifetime)} Discord users with the 'Lifetime' role.")
-
-        # Sync Subscribers group
-        if subscriber_role:
-            # Remove users from LLDAP Subscribers if they don't have the Discord role
-            removed_from_subscribers = []
-            for discord_id, user in subscriber_ldap_users.items():
-                if discord_id not in discord_subscribers:
-                    print(f"🚨 User {user['displayName']} ({discord_id}) is in LLDAP Subscribers but does NOT have the Discord role! Removing from Subscribers group...")
-                    await self.user_manager.remove_from_subscribers_group(user["id"])
-                    removed_from_subscribers.append(user["id"])
-
-            # Add users to LLDAP Subscribers if they have the Discord role but are not in the group
-            added_to_subscribers = []
-            for discord_id, username in discord_subscribers.items():
-                if discord_id not in subscriber_ldap_users:
-                    print(f"🟢 User {username} ({discord_id}) has the Discord Subscriber role but is NOT in LLDAP! Adding to Subscribers group...")
-                    lldap_user_id = await self.user_manager.get_user_by_discord_id(discord_id)
-                    if lldap_user_id:
-                        await self.user_manager.add_to_subscribers_group(lldap_user_id)
-                        added_to_subscribers.append(discord_id)
-
-        # Sync Lifetime group
-        if lifetime_role:
-            # Remove users from LLDAP Lifetime if they don't have the Discord role
-            removed_from_lifetime = []
-            for discord_id, user in lifetime_ldap_users.items():
-                if discord_id not in discord_lifetime:
-                    print(f"🚨 User {user['displayName']} ({discord_id}) is in LLDAP Lifetime but does NOT have the Discord role! Removing from Lifetime group...")
-                    await self.user_manager.remove_from_group(user["id"], self.lifetime_group_id)
-                    removed_from_lifetime.append(user["id"])
-
-            # Add users to LLDAP Lifetime if they have the Discord role but are not in the group
-            added_to_lifetime = []
-            for discord_id, username in discord_lifetime.items():
-                if discord_id not in lifetime_ldap_users:
-                    print(f"🟢 User {username} ({discord_id}) has the Discord Lifetime role but is NOT in LLDAP! Adding to Lifetime group...")
-                    lldap_user_id = await self.user_manager.get_user_by_discord_id(discord_id)
-                    if lldap_user_id:
-                        await self.user_manager.add_to_group(lldap_user_id, self.lifetime_group_id)
-                        added_to_lifetime.append(discord_id)
-
-        print(f"🔄 Sync complete: "
-              f"Subscribers - Removed {len(removed_from_subscribers)} users, Added {len(added_to_subscribers)} users; "
-              f"Lifetime - Removed {len(removed_from_lifetime)} users, Added {len(added_to_lifetime)} users.")
\ No newline at end of file
+        counts = {}
+        for result in report.succeeded:
+            group_id, action, _ = result.label
+            counts[(group_id, action)] = counts.get((group_id, action), 0) + 1
+        group_summaries = "; ".join(
+            f"{group.label} - Removed {counts.get((group.group_id, 'remove'), 0)} users, "
+            f"Added {counts.get((group.group_id, 'add'), 0)} users"
+            for group in plan.groups
+        )
+        logger.info(f"🔄 Sync complete: {group_summaries}. Mutations: {report.summary()}", extra={
+            "event": "sync_complete", "duration": round(time.monotonic() - started, 3), "planned": plan.add_count + plan.remove_count,
+            "succeeded": len(report.succeeded), "failed": len(report.failed), "ldap_refreshed": plan.ldap_refreshed,
+        })
+        logger.info(f"📊 GraphQL latency:\n{self.user_manager.graphql_client.latency_summary()}")
+        return plan, report
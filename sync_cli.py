@@ -0,0 +1,119 @@
+"""One-shot full sync from the command line, with a dry-run mode that only prints the plan.
+
+Logs in to Discord as the bot without registering commands or background tasks, computes the
+same plan a scheduled full sync would (always re-reading LLDAP), prints it and, unless
+--dry-run is given, applies it. Removals held back by the removal guard are only applied
+with --force.
+
+Usage: python sync_cli.py [--dry-run] [--force]
+"""
+import argparse
+import asyncio
+import logging
+import discord
+from environment_config import EnvironmentConfig
+from auth_manager import AuthManager
+from circuit_breaker import CircuitBreaker
+from graphql_client import GraphQLClient
+from ldap_manager import LDAPManager
+from user_manager import UserManager
+from subscription_sync import SubscriptionSync
+from mutation_executor import MutationExecutor
+from logging_config import configure_logging
+from role_index import RoleHolderIndex
+from state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run one full Discord role -> LLDAP group sync.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the changes a sync would make")
+    parser.add_argument("--force", action="store_true", help="Apply removals even when they exceed the removal guard")
+    return parser.parse_args()
+
+
+async def run_sync(subscriptions_sync, dry_run, force):
+    plan, report = await subscriptions_sync.sync(refresh=True, dry_run=dry_run, force=force)
+    print(plan.summary())
+    guarded = subscriptions_sync.guarded_groups(plan)
+    if guarded and not force:
+        labels = ", ".join(group.label for group in plan.groups if group.group_id in guarded)
+        print(f"Removals held back by the removal guard for {labels}; re-run with --force to apply them.")
+    if report is not None:
+        print(f"Mutations: {report.summary()}")
+    return report is None or not report.failed
+
+
+async def main():
+    args = parse_args()
+    config = EnvironmentConfig()
+    log_listener = configure_logging(config.log_level, config.log_json)
+
+    auth_manager = AuthManager(
+        config.lldap_login_url, config.get_ldap_username(), config.ldap_bind_password,
+        renew_before_seconds=config.jwt_renew_before_seconds
+    )
+    await auth_manager.initialize()
+    graphql_client = GraphQLClient(
+        config.lldap_login_url, auth_manager,
+        pool_size=config.graphql_pool_size, keepalive_timeout=config.graphql_keepalive_seconds,
+        schema_cache_path=config.schema_cache_path,
+        timeout=config.lldap_timeout, retries=config.lldap_retries,
+        breaker=CircuitBreaker("LLDAP", config.circuit_breaker_failures, config.circuit_breaker_reset_seconds)
+    )
+    await graphql_client.initialize()
+    state_store = StateStore(config.state_db_path) if config.state_db_path else None
+    ldap_manager = LDAPManager(
+        config.ldap_server, config.ldap_bind_dn, config.ldap_bind_password, pool_size=config.ldap_pool_size,
+        timeout=config.ldap_timeout, retries=config.ldap_retries,
+        breaker=CircuitBreaker("LDAP", config.circuit_breaker_failures, config.circuit_breaker_reset_seconds)
+    )
+    user_manager = UserManager(
+        graphql_client, ldap_manager, config.ldap_base_dn,
+        discord_id_index_ttl=config.discord_id_index_ttl,
+        state_store=state_store
+    )
+
+    # Members are chunked per guild into the role holder index rather than cached by discord.py
+    intents = discord.Intents.default()
+    intents.guilds = True
+    intents.members = True
+    client = discord.Client(intents=intents, member_cache_flags=discord.MemberCacheFlags.none(), chunk_guilds_at_startup=False)
+    subscriptions_sync = SubscriptionSync(
+        client,
+        user_manager,
+        config.role_mappings,
+        mutation_executor=MutationExecutor(config.sync_concurrency, config.sync_rate_limit),
+        batch_size=config.sync_batch_size,
+        role_index=RoleHolderIndex(),
+        state_store=state_store,
+        ldap_refresh_interval=config.ldap_refresh_interval_minutes * 60,
+        max_removals=config.sync_max_removals,
+        max_removal_percent=config.sync_max_removal_percent
+    )
+    succeeded = False
+
+    @client.event
+    async def on_ready():
+        nonlocal succeeded
+        try:
+            succeeded = await run_sync(subscriptions_sync, args.dry_run, args.force)
+        except Exception as e:
+            logger.error(f"❌ Sync failed: {e}")
+        finally:
+            await client.close()
+
+    try:
+        await client.start(config.discord_bot_token)
+    finally:
+        await graphql_client.close()
+        await ldap_manager.close()
+        await auth_manager.close()
+        if state_store is not None:
+            state_store.close()
+        log_listener.stop()
+    return succeeded
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if asyncio.run(main()) else 1)
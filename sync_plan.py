@@ -0,0 +1,53 @@
+from collections import namedtuple
+
+class GroupDiff(namedtuple("GroupDiff", "group_id label current_size adds removes unresolved removals_allowed")):
+    """The changes one LLDAP group needs to match the holders of its Discord roles.
+
+    `adds` and `removes` are sorted tuples of (discord_id, lldap_user_id). `unresolved` holds the
+    Discord IDs of role holders with no LLDAP account. `removals_allowed` is False when a guild
+    mapping to this group could not be scanned, so nobody can safely be removed.
+    """
+    __slots__ = ()
+
+    def summary(self):
+        line = f"{self.label}: +{len(self.adds)} / -{len(self.removes)} of {self.current_size} members"
+        if self.unresolved:
+            line += f", {len(self.unresolved)} role holders without an account"
+        if not self.removals_allowed:
+            line += " (removals skipped: a server could not be scanned)"
+        return line
+
+
+class SyncPlan(namedtuple("SyncPlan", "groups ldap_refreshed")):
+    """An immutable full sync diff: one GroupDiff per synced group, computed without changing anything."""
+    __slots__ = ()
+
+    @property
+    def add_count(self):
+        return sum(len(group.adds) for group in self.groups)
+
+    @property
+    def remove_count(self):
+        return sum(len(group.removes) for group in self.groups)
+
+    @property
+    def unresolved(self):
+        """Discord IDs holding a mapped role without an LLDAP account, across all groups."""
+        return frozenset(discord_id for group in self.groups for discord_id in group.unresolved)
+
+    def operations(self, skip_removals_for=()):
+        """Returns the plan as ((group_id, action, discord_id), (action, lldap_user_id, group_id)) operations."""
+        operations = []
+        for group in self.groups:
+            if group.group_id not in skip_removals_for:
+                for discord_id, lldap_user_id in group.removes:
+                    operations.append(((group.group_id, "remove", discord_id), ("remove", lldap_user_id, group.group_id)))
+            for discord_id, lldap_user_id in group.adds:
+                operations.append(((group.group_id, "add", discord_id), ("add", lldap_user_id, group.group_id)))
+        return operations
+
+    def summary(self):
+        source = "LLDAP" if self.ldap_refreshed else "the local snapshot"
+        lines = [f"{self.add_count} adds, {self.remove_count} removals (LLDAP state from {source})"]
+        lines.extend(group.summary() for group in self.groups)
+        return "\n".join(lines)
@@ -0,0 +1,66 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+class SyncProfiler:
+    """Profiles the next full sync with cProfile once armed, and writes its hotspots to files.
+
+    Everything that runs on the event loop thread while the sync is in progress is included,
+    so concurrent /register commands or member events may show up in the profile too.
+    """
+
+    def __init__(self, output_dir="profiles", top=40):
+        self.output_dir = output_dir
+        self.top = top
+        self.armed = False
+        self.last_report_path = None
+
+    def arm(self):
+        """Profiles the next sync that starts."""
+        self.armed = True
+        logger.info("🔬 The next full sync will be profiled.")
+
+    @asynccontextmanager
+    async def profile_if_armed(self, name="sync"):
+        """Async context manager that profiles the wrapped block if the profiler is armed, then disarms it.
+
+        The reports are written on a worker thread, so saving them doesn't stall the event loop.
+        """
+        if not self.armed:
+            yield
+            return
+        self.armed = False
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            try:
+                await asyncio.to_thread(self.write_report, profiler, name)
+            except Exception as e:
+                # Losing the report must not fail (or mask the outcome of) the sync it profiled
+                logger.warning(f"⚠️ Failed to write the sync profile to {self.output_dir}: {e}")
+
+    def write_report(self, profiler, name):
+        """Writes the raw profile (for snakeviz or pstats) and a text summary of the top hotspots."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        profiler.dump_stats(f"{base}.prof")
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary).strip_dirs()
+        summary.write(f"Top {self.top} functions by own time:\n")
+        stats.sort_stats("tottime").print_stats(self.top)
+        summary.write(f"\nTop {self.top} functions by cumulative time:\n")
+        stats.sort_stats("cumulative").print_stats(self.top)
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+        self.last_report_path = f"{base}.txt"
+        logger.info(f"🔬 Wrote sync profile to {base}.txt and {base}.prof")
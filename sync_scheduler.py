@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SYNC_RUNS = REGISTRY.counter("sync_runs_total", "Full syncs run by the scheduler, by outcome.", ["outcome"])
+SYNC_QUEUED_TRIGGERS = REGISTRY.gauge("sync_queued_triggers", "Sync triggers waiting on the next queued full sync.")
+
+class SyncScheduler:
+    """Runs full syncs one at a time, coalescing overlapping triggers.
+
+    A trigger waits out a short debounce window so near-simultaneous triggers share one run.
+    Triggers that arrive while a sync is running queue a single follow-up run, which every
+    such trigger then waits on, so at most one sync runs and at most one is queued.
+    """
+
+    def __init__(self, subscriptions_sync, debounce_seconds=2):
+        self.subscriptions_sync = subscriptions_sync
+        self.debounce_seconds = debounce_seconds
+        self.queued = None  # Future resolved when the next (not yet started) run finishes
+        self.queued_refresh = False
+        self.queued_force = False
+        self.queued_triggers = 0
+        self.running = False
+        self.runner = None
+        self.runs = 0
+        self.coalesced_triggers = 0
+        self.last_duration = None
+        self.last_finished_at = None
+        self.last_error = None
+
+    @property
+    def queue_depth(self):
+        """Number of triggers waiting on the queued run."""
+        return self.queued_triggers
+
+    async def trigger(self, refresh=False, force=False):
+        """Requests a full sync and waits until a run that started after this call has finished.
+
+        Returns that run's (plan, report), or raises its exception if it failed. `refresh` forces
+        the run to re-read LLDAP and `force` lets it bypass the removal guard.
+        """
+        if self.queued is None:
+            self.queued = asyncio.get_running_loop().create_future()
+        else:
+            self.coalesced_triggers += 1
+        self.queued_refresh = self.queued_refresh or refresh
+        self.queued_force = self.queued_force or force
+        self.queued_triggers += 1
+        SYNC_QUEUED_TRIGGERS.set(self.queued_triggers)
+        waiter = self.queued
+        if self.runner is None or self.runner.done():
+            self.runner = asyncio.create_task(self.run_queued())
+        return await asyncio.shield(waiter)
+
+    async def run_queued(self):
+        """Runs queued syncs back to back until no trigger is left waiting."""
+        while self.queued is not None:
+            await asyncio.sleep(self.debounce_seconds)  # Triggers arriving now join this run
+            # Pause while LLDAP's circuit breaker is open instead of failing every request of the run
+            paused_for = self.subscriptions_sync.lldap_retry_after()
+            while paused_for:
+                logger.warning(f"⏸️ LLDAP is unavailable; full sync paused for {paused_for:.0f}s.")
+                await asyncio.sleep(paused_for)
+                paused_for = self.subscriptions_sync.lldap_retry_after()
+            waiter, refresh, force = self.queued, self.queued_refresh, self.queued_force
+            self.queued, self.queued_refresh, self.queued_force, self.queued_triggers = None, False, False, 0
+            SYNC_QUEUED_TRIGGERS.set(0)
+            self.running = True
+            started = time.monotonic()
+            try:
+                result = await self.subscriptions_sync.sync(refresh=refresh, force=force)
+                self.last_error = None
+                SYNC_RUNS.inc("ok")
+                waiter.set_result(result)
+            except Exception as e:
+                SYNC_RUNS.inc("error")
+                logger.exception(f"❌ Full sync failed: {e}")
+                self.last_error = e
+                waiter.set_exception(e)
+            finally:
+                self.running = False
+                self.runs += 1
+                self.last_duration = time.monotonic() - started
+                self.last_finished_at = time.time()
+
+    def status(self):
+        """Returns a short human readable summary for admins."""
+        state = "running" if self.running else "idle"
+        lines = [f"State: {state}, queued triggers: {self.queue_depth}"]
+        if self.last_duration is not None:
+            outcome = f"failed ({self.last_error})" if self.last_error else "succeeded"
+            lines.append(f"Last run: {outcome} in {self.last_duration:.1f}s, <t:{int(self.last_finished_at)}:R>")
+        lines.append(f"Runs: {self.runs}, coalesced triggers: {self.coalesced_triggers}")
+        breaker = self.subscriptions_sync.user_manager.graphql_client.breaker
+        if breaker.state != "closed":
+            lines.append(f"LLDAP circuit breaker: {breaker.state.replace('_', '-')}, next probe in {breaker.retry_after:.0f}s")
+        state_store = self.subscriptions_sync.state_store
+        if state_store is not None:
+            lines.append(f"Outbox: {state_store.pending_count()} changes waiting, {state_store.dead_letter_count()} given up on")
+        return "\n".join(lines)
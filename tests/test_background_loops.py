@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+from circuit_breaker import CircuitOpenError
+from discord_bot import DiscordBot
+
+
+class FailingSync:
+    """SubscriptionSync stand-in whose full syncs and event applications always fail."""
+
+    def __init__(self):
+        self.role_mappings = None
+        self.user_manager = SimpleNamespace()
+        self.state_store = None
+        self.syncs = 0
+        self.applications = 0
+
+    def lldap_retry_after(self):
+        return 0.0
+
+    async def sync(self, refresh=False, force=False):
+        self.syncs += 1
+        raise CircuitOpenError("LLDAP is unavailable; next attempt in 30.0s")
+
+    async def apply_pending_changes(self, full_sync=None):
+        self.applications += 1
+        raise RuntimeError("LLDAP returned an error")
+
+
+async def run_loop(loop, runs_attr, subscriptions_sync, **interval):
+    loop.change_interval(**interval)
+    loop.start()
+    try:
+        for _ in range(200):
+            if getattr(subscriptions_sync, runs_attr) >= 3:
+                break
+            await asyncio.sleep(0.01)
+        assert loop.is_running()
+        assert not loop.failed()
+    finally:
+        loop.cancel()
+
+
+def test_full_sync_loop_survives_failed_syncs(caplog):
+    subscriptions_sync = FailingSync()
+    bot = DiscordBot("token", subscriptions_sync, "Service", sync_debounce_seconds=0)
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(run_loop(bot.sync_subscriptions, "syncs", subscriptions_sync, seconds=0.01))
+    assert subscriptions_sync.syncs >= 3
+    assert "Scheduled full sync failed" in caplog.text
+
+
+def test_member_event_loop_survives_failed_applications(caplog):
+    subscriptions_sync = FailingSync()
+    bot = DiscordBot("token", subscriptions_sync, "Service")
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(run_loop(bot.apply_member_events, "applications", subscriptions_sync, seconds=0.01))
+    assert subscriptions_sync.applications >= 3
+    assert "Failed to apply member role changes" in caplog.text
@@ -0,0 +1,36 @@
+import json
+import logging
+import logging.handlers
+import queue
+from logging_config import LogQueueHandler, StructuredFormatter
+
+
+def emit_through_queue(logger_name, log):
+    """Logs through a LogQueueHandler and returns the JSON line the listener side writes."""
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger(logger_name)
+    logger.propagate = False
+    logger.handlers[:] = [LogQueueHandler(log_queue)]
+    logger.setLevel(logging.INFO)
+    log(logger)
+    return json.loads(StructuredFormatter(json_output=True).format(log_queue.get_nowait()))
+
+
+def test_json_output_keeps_the_exception_separate():
+    def log(logger):
+        try:
+            raise ValueError("bad value")
+        except ValueError:
+            logger.exception("Sync failed for %s", "guild", extra={"event": "sync_failed"})
+
+    entry = emit_through_queue("tests.logging.exception", log)
+    assert entry["message"] == "Sync failed for guild"
+    assert entry["event"] == "sync_failed"
+    assert "Traceback" in entry["exception"]
+    assert "ValueError: bad value" in entry["exception"]
+
+
+def test_json_output_without_exception_has_no_exception_field():
+    entry = emit_through_queue("tests.logging.plain", lambda logger: logger.info("Synced %d groups", 3))
+    assert entry["message"] == "Synced 3 groups"
+    assert "exception" not in entry
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+from subscription_sync import SubscriptionSync
+
+
+class FlakyUserManager:
+    """UserManager stand-in whose first Discord ID lookup fails."""
+
+    def __init__(self):
+        self.graphql_client = SimpleNamespace(breaker=SimpleNamespace(allows_request=lambda: True, retry_after=0.0))
+        self.lookups = 0
+        self.applied = []
+
+    async def resolve_discord_id(self, discord_id):
+        self.lookups += 1
+        if self.lookups == 1:
+            raise TimeoutError("LLDAP timed out")
+        return f"user{discord_id}"
+
+    async def apply_group_changes(self, changes, max_batch_size=50):
+        self.applied.extend(changes)
+        return [{"ok": True} for _ in changes]
+
+
+def test_change_is_kept_when_the_member_cannot_be_resolved():
+    user_manager = FlakyUserManager()
+    subscriptions_sync = SubscriptionSync(SimpleNamespace(guilds=[]), user_manager, None)
+    subscriptions_sync.queue_member_change(1, set(), {4})
+    asyncio.run(subscriptions_sync.apply_pending_changes())
+    assert user_manager.applied == []
+    assert subscriptions_sync.pending_changes == {"1": {"add": set(), "remove": {4}}}
+    asyncio.run(subscriptions_sync.apply_pending_changes())
+    assert user_manager.applied == [("remove", "user1", 4)]
+
+
+def test_requeued_change_does_not_override_a_newer_event():
+    subscriptions_sync = SubscriptionSync(None, FlakyUserManager(), None)
+    subscriptions_sync.queue_member_change(1, {4}, set())  # Newer event: role granted again
+    subscriptions_sync.requeue_member_change("1", {"add": {5}, "remove": {4}})
+    assert subscriptions_sync.pending_changes == {"1": {"add": {4, 5}, "remove": set()}}
+
+
+def test_takeover_full_sync_rereads_lldap():
+    from discord_bot import DiscordBot
+    subscriptions_sync = SubscriptionSync(SimpleNamespace(guilds=[]), FlakyUserManager(), SimpleNamespace())
+    bot = DiscordBot("token", subscriptions_sync, "Service")
+    bot.on_leadership_change(True)
+    calls = []
+
+    async def full_sync(refresh=False):
+        calls.append(refresh)
+
+    asyncio.run(subscriptions_sync.apply_pending_changes(full_sync=full_sync))
+    assert calls == [True]
+    assert not subscriptions_sync.full_sync_refresh
+
+
+def test_member_events_wait_for_a_running_full_sync():
+    from mutation_executor import ExecutionReport
+    from sync_plan import SyncPlan
+    user_manager = FlakyUserManager()
+    user_manager.lookups = 1  # Resolve on the first try
+    user_manager.graphql_client.latency_summary = lambda: ""
+    subscriptions_sync = SubscriptionSync(SimpleNamespace(guilds=[]), user_manager, None)
+    writes = []
+
+    async def plan(refresh=False):
+        return SyncPlan((), refresh)
+
+    async def apply(plan, force=False):
+        # A full sync planned before the role was granted removes the member
+        await asyncio.sleep(0.05)
+        writes.append("full sync remove")
+        return ExecutionReport([], 0.05)
+
+    async def apply_group_changes(changes):
+        writes.extend(f"event {action}" for action, _, _ in changes)
+        return [{"ok": True} for _ in changes]
+
+    subscriptions_sync.plan, subscriptions_sync.apply = plan, apply
+    subscriptions_sync.apply_group_changes = apply_group_changes
+
+    async def run():
+        full_sync = asyncio.create_task(subscriptions_sync.sync())
+        await asyncio.sleep(0.01)
+        subscriptions_sync.queue_member_change(1, {4}, set())
+        await subscriptions_sync.apply_pending_changes()
+        await full_sync
+
+    asyncio.run(run())
+    assert writes == ["full sync remove", "event add"]
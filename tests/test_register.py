@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+from circuit_breaker import CircuitOpenError
+from discord_bot import DiscordBot
+from metrics import StageTimings
+from role_mapping import GuildRoleMappings, RoleGroupMapping, RoleMappingTable
+
+
+class Followup:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content, ephemeral=False):
+        self.messages.append(content)
+
+
+class Response:
+    def __init__(self):
+        self.deferred = False
+
+    async def defer(self, ephemeral=False, thinking=False):
+        self.deferred = True
+
+
+class UnavailableUserManager:
+    """UserManager stand-in whose LLDAP circuit breaker is open."""
+
+    def __init__(self):
+        self.create_user_timings = StageTimings()
+
+    async def check_registration_conflicts(self, email, discord_id):
+        raise CircuitOpenError("LLDAP is unavailable; next attempt in 30.0s")
+
+
+def test_register_answers_when_lldap_is_unavailable():
+    role = SimpleNamespace(id=10, name="Subscriber")
+    subscriptions_sync = SimpleNamespace(
+        role_mappings=GuildRoleMappings(RoleMappingTable([RoleGroupMapping("10", 4)])),
+        user_manager=UnavailableUserManager(),
+    )
+    bot = DiscordBot("token", subscriptions_sync, "Service")
+    interaction = SimpleNamespace(
+        guild=SimpleNamespace(id=1),
+        user=SimpleNamespace(id=1234, name="alice", roles=[role]),
+        response=Response(),
+        followup=Followup(),
+    )
+    asyncio.run(bot.register_command(interaction, "alice@example.com"))
+    assert interaction.response.deferred
+    assert len(interaction.followup.messages) == 1
+    assert "try again" in interaction.followup.messages[0]
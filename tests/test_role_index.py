@@ -0,0 +1,47 @@
+import asyncio
+from benchmarks.synthetic_discord import FakeGuild, FakeRole
+from role_index import RoleHolderIndex
+
+
+def test_rebuild_drops_drift_from_missed_member_updates():
+    role = FakeRole(10, "Subscriber")
+    guild = FakeGuild(1, "Guild", [role])
+    guild.add_member(100, "alice", [role])
+    role_index = RoleHolderIndex()
+
+    async def run():
+        index = await role_index.ensure_guild(guild, {10: {4}})
+        assert index.memberships() == {4: {"100": "alice"}}
+        # Bob gets the role while the gateway is disconnected, so no member update arrives
+        guild.add_member(200, "bob", [role])
+        assert (await role_index.ensure_guild(guild, {10: {4}})).memberships() == {4: {"100": "alice"}}
+        return await role_index.ensure_guild(guild, {10: {4}}, rebuild=True)
+
+    assert asyncio.run(run()).memberships() == {4: {"100": "alice", "200": "bob"}}
+
+
+class CountingGuild(FakeGuild):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.chunks = 0
+
+    async def chunk(self, cache=True):
+        self.chunks += 1
+        return await super().chunk(cache)
+
+
+def test_full_syncs_reuse_the_index_unless_asked_to_rebuild():
+    from types import SimpleNamespace
+    from subscription_sync import SubscriptionSync
+    role = FakeRole(10, "Subscriber")
+    guild = CountingGuild(1, "Guild", [role])
+    guild.add_member(100, "alice", [role])
+    subscriptions_sync = SubscriptionSync(None, SimpleNamespace(), None, role_index=RoleHolderIndex())
+
+    async def run():
+        await subscriptions_sync.discord_memberships(guild, {10: {4}})
+        await subscriptions_sync.discord_memberships(guild, {10: {4}})  # A dry run or event-triggered sync
+        await subscriptions_sync.discord_memberships(guild, {10: {4}}, rebuild_index=True)  # Scheduled sync
+
+    asyncio.run(run())
+    assert guild.chunks == 2
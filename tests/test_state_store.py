@@ -0,0 +1,33 @@
+from state_store import StateStore
+
+
+def test_failed_change_is_dead_lettered_after_max_attempts(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    change = (4, "add", "1", "alice")
+    store.enqueue([change])
+    for _ in range(store.MAX_ATTEMPTS - 1):
+        assert store.fail([change], TimeoutError("timed out")) == 0
+    assert store.pending_count() == 1
+    assert store.fail([change], TimeoutError("timed out")) == 1
+    assert store.pending_count() == 0
+    assert store.dead_letter_count() == 1
+    store.close()
+
+
+def test_permanent_failure_is_dead_lettered_at_once(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    store.enqueue([(4, "add", "1", "ghost")])
+    assert store.fail([(4, "add", "1", "ghost")], Exception("no such user"), permanent=True) == 1
+    assert store.due_changes(now=float("inf")) == []
+    assert store.dead_letter_count() == 1
+    store.close()
+
+
+def test_directly_applied_adds_are_recorded_in_the_snapshot(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    store.save_memberships({4: {"1": "alice"}})
+    store.complete([(4, "add", "2", "bob")])
+    assert store.load_memberships([4]) == {4: {"1": "alice", "2": "bob"}}
+    store.invalidate_snapshot()
+    assert store.snapshot_age([4]) is None
+    store.close()
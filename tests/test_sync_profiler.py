@@ -0,0 +1,38 @@
+import asyncio
+from sync_profiler import SyncProfiler
+
+
+async def profiled(profiler, body):
+    async with profiler.profile_if_armed():
+        return await body()
+
+
+def test_unwritable_profile_dir_does_not_fail_the_profiled_sync(tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    profiler = SyncProfiler(str(blocker / "profiles"))
+    profiler.arm()
+
+    async def body():
+        return "applied"
+
+    assert asyncio.run(profiled(profiler, body)) == "applied"
+    assert not profiler.armed
+    assert profiler.last_report_path is None
+
+
+def test_unwritable_profile_dir_keeps_the_sync_error(tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    profiler = SyncProfiler(str(blocker / "profiles"))
+    profiler.arm()
+
+    async def body():
+        raise RuntimeError("LLDAP returned an error")
+
+    try:
+        asyncio.run(profiled(profiler, body))
+    except RuntimeError as e:
+        assert str(e) == "LLDAP returned an error"
+    else:
+        raise AssertionError("the sync error was swallowed")
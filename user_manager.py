@@ -1,79 +1,132 @@
+import asyncio
 import random
 import string
-from gql import gql
+import time
+from metrics import REGISTRY, StageTimings
 
 class UserManager:
     """Handles user-related operations for LLDAP, including creation and group management."""
+
+    GROUP_MEMBERSHIP_ARGUMENT_TYPES = {"userId": "String!", "groupId": "Int!"}
+    GROUP_MEMBERSHIP_MUTATIONS = {"add": "addUserToGroup", "remove": "removeUserFromGroup"}
+    CREATE_USER_ARGUMENT_TYPES = {"user": "CreateUserInput!"}
+    UPDATE_USER_ARGUMENT_TYPES = {"user": "UpdateUserInput!"}
     
-    def __init__(self, graphql_client, ldap_manager, subscribers_group_id, ldap_base_dn):
+    def __init__(self, graphql_client, ldap_manager, ldap_base_dn, discord_id_index_ttl=600, state_store=None,
+                 registration_cache=None):
         self.graphql_client = graphql_client
         self.ldap_manager = ldap_manager
-        self.subscribers_group_id = subscribers_group_id
         self.ldap_base_dn = ldap_base_dn
+        self.discord_id_index_ttl = discord_id_index_ttl
+        self.discord_id_index = None  # Discord ID -> LLDAP user ID, built by get_discord_id_index()
+        self.discord_id_index_built_at = 0.0
+        self.state_store = state_store
+        self.registration_cache = registration_cache  # RegistrationCache of known emails and Discord IDs
+        self.registration_checks = {}  # (email, Discord ID) -> in-flight CheckRegistration task
+        if state_store is not None:
+            # Start from the index saved before the last restart, aged by how long ago it was fetched
+            index, saved_at = state_store.load_discord_ids()
+            if index is not None:
+                self.discord_id_index = index
+                self.discord_id_index_built_at = time.monotonic() - (time.time() - saved_at)
+        self.create_user_timings = StageTimings(REGISTRY.histogram(
+            "lldap_create_user_stage_seconds", "Time spent in each stage of creating an LLDAP user.", ["stage"]
+        ))
 
     @staticmethod
     def generate_temp_password(length=12):
         """Generates a random temporary password."""
         return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
-    async def check_email_exists(self, email):
-        """Checks if an email is already associated with an LLDAP account."""
-        normalized_email = email.lower()
-        query = gql("""
-        query GetUserByEmail($email: String!) {
-            users(filters: { eq: { field: "email", value: $email } }) {
-                id
-            }
-        }
-        """)
-        result = await self.graphql_client.execute_query(query, {"email": normalized_email})
-        return len(result.get("users", [])) > 0
-
-    async def check_discord_id_exists(self, discord_id):
-        """Checks if a Discord ID is already linked to an LLDAP account."""
-        query = gql("""
-        query GetUserByDiscordId($discordid: String!) {
-            users(filters: { eq: { field: "discordid", value: $discordid } }) {
-                id
-            }
+    @staticmethod
+    def get_attribute_value(attributes, name):
+        """Extracts attribute value by name from LLDAP user attributes."""
+        for attr in attributes:
+            if attr['name'] == name:
+                return attr['value'][0] if attr['value'] else None
+        return None
+
+    @staticmethod
+    def user_input(display_name, email, discord_id):
+        """Builds the CreateUserInput for a new account linked to a Discord ID."""
+        return {
+            "id": display_name,  # This is now the chosen username
+            "displayName": display_name,
+            "email": email,
+            "attributes": [{"name": "discordid", "value": [discord_id]}]
         }
-        """)
-        result = await self.graphql_client.execute_query(query, {"discordid": discord_id})
-        return len(result.get("users", [])) > 0
 
-    async def create_user(self, display_name, email, discord_id, subscriber_group=True, lifetime_group=False, lifetime_group_id=None):
-        """Creates a new LLDAP user and adds them to appropriate groups based on parameters."""
+    async def check_registration_conflicts(self, email, discord_id):
+        """Checks email and Discord ID uniqueness. Returns (email_exists, discord_id_exists).
+
+        A value cached as taken is rejected without asking LLDAP. Everything else is confirmed with a
+        single request, shared by concurrent checks for the same email and Discord ID.
+        """
+        email = email.lower()
+        if self.registration_cache is not None:
+            email_taken = self.registration_cache.lookup("email", email)
+            discord_id_taken = self.registration_cache.lookup("discord_id", discord_id)
+            if email_taken or discord_id_taken:
+                return bool(email_taken), bool(discord_id_taken)
+
+        key = (email, discord_id)
+        check = self.registration_checks.get(key)
+        if check is None:
+            check = self.registration_checks[key] = asyncio.create_task(self._check_registration_conflicts(email, discord_id))
+            check.add_done_callback(lambda _: self.registration_checks.pop(key, None))
+        # Shield so that one caller giving up doesn't fail the others waiting on the same check
+        return await asyncio.shield(check)
+
+    async def _check_registration_conflicts(self, email, discord_id):
+        result = await self.graphql_client.execute_query(
+            "CheckRegistration", {"email": email, "discordid": discord_id}
+        )
+        email_exists, discord_id_exists = len(result.get("byEmail", [])) > 0, len(result.get("byDiscordId", [])) > 0
+        if self.registration_cache is not None:
+            self.registration_cache.record("email", email, email_exists)
+            self.registration_cache.record("discord_id", discord_id, discord_id_exists)
+        return email_exists, discord_id_exists
+
+    async def create_user(self, display_name, email, discord_id, group_ids):
+        """Creates a new LLDAP user and adds them to the given LLDAP groups."""
         temp_password = self.generate_temp_password()
-        create_user_mutation = gql("""
-        mutation CreateUser($input: CreateUserInput!) {
-            createUser(user: $input) {
-                id
-            }
-        }
-        """)
-        variables = {
-            "input": {
-                "id": display_name,  # This is now the chosen username
-                "displayName": display_name,
-                "email": email,
-                "attributes": [{"name": "discordid", "value": [discord_id]}]
-            }
-        }
+        variables = {"input": self.user_input(display_name, email, discord_id)}
 
         try:
-            result = await self.graphql_client.execute_mutation(create_user_mutation, variables)
+            with self.create_user_timings.time("create"):
+                result = await self.graphql_client.execute_mutation("CreateUser", variables)
             user_id = result["createUser"]["id"]
 
-            # Set LDAP password
+            # Keep the cached index current so sync can resolve the new user without a refetch
+            if self.discord_id_index is not None:
+                self.discord_id_index[discord_id] = user_id
+            if self.state_store is not None:
+                self.state_store.set_discord_id(discord_id, user_id)
+            if self.registration_cache is not None:
+                self.registration_cache.add_account(email, discord_id)
+
+            # Group assignments go out as a single batched request
+            group_changes = [("add", user_id, group_id) for group_id in sorted(group_ids)]
+
+            # The LDAP password and the group memberships are independent, so set them concurrently
             user_dn = f"uid={user_id},ou=people,{self.ldap_base_dn}"
-            if not self.ldap_manager.set_password(user_dn, temp_password):
+            with self.create_user_timings.time("password_and_groups"):
+                password_set, group_outcomes = await asyncio.gather(
+                    self.ldap_manager.set_password(user_dn, temp_password),
+                    self.apply_group_changes(group_changes),
+                )
+            if self.state_store is not None:
+                # Record the adds in the membership snapshot, or the next full sync would plan them again
+                self.state_store.complete(
+                    (group_id, "add", discord_id, user_id)
+                    for (_, _, group_id), outcome in zip(group_changes, group_outcomes)
+                    if not isinstance(outcome, Exception)
+                )
+            if not password_set:
                 return None, "Failed to set LDAP password"
-
-            # Add to groups based on parameters
-            if subscriber_group:
-                await self.add_to_subscribers_group(user_id)
-            if lifetime_group and lifetime_group_id:
-                await self.add_to_group(user_id, lifetime_group_id)
+            for outcome in group_outcomes:
+                if isinstance(outcome, Exception):
+                    raise outcome
 
             return temp_password, None
         except Exception as e:
@@ -81,52 +134,98 @@ class UserManager:
 
 
 
-    async def remove_from_group(self, user_id, group_id):
-        """Removes a user from a specified group in LLDAP."""
-        mutation = gql("""
-        mutation RemoveUserFromGroup($userId: String!, $groupId: Int!) {
-            removeUserFromGroup(userId: $userId, groupId: $groupId) {
-                ok
-            }
-        }
-        """)
-        await self.graphql_client.execute_mutation(mutation, {"userId": user_id, "groupId": group_id})
-
-
-    async def add_to_subscribers_group(self, user_id):
-        """Adds a user to the Subscribers group in LLDAP."""
-        await self.add_to_group(user_id, self.subscribers_group_id)
-
-    async def add_to_group(self, user_id, group_id):
-        """Adds a user to a specified group in LLDAP."""
-        mutation = gql("""
-        mutation AddUserToGroup($userId: String!, $groupId: Int!) {
-            addUserToGroup(userId: $userId, groupId: $groupId) {
-                ok
-            }
-        }
-        """)
-        await self.graphql_client.execute_mutation(mutation, {"userId": user_id, "groupId": group_id})
-
-    async def remove_from_subscribers_group(self, user_id):
-        """Removes a user from the Subscribers group in LLDAP."""
-        mutation = gql("""
-        mutation RemoveUserFromGroup($userId: String!, $groupId: Int!) {
-            removeUserFromGroup(userId: $userId, groupId: $groupId) {
-                ok
-            }
-        }
-        """)
-        await self.graphql_client.execute_mutation(mutation, {"userId": user_id, "groupId": self.subscribers_group_id})
+    async def create_users_batch(self, accounts, max_batch_size=50):
+        """Creates many (display_name, email, discord_id) accounts as batched createUser mutations.
+
+        Passwords and groups are left to the caller. Returns one entry per account: the new
+        LLDAP user ID, or the exception its creation failed with.
+        """
+        calls = [
+            ("createUser", {"user": self.user_input(display_name, email, discord_id)}, self.CREATE_USER_ARGUMENT_TYPES, "id")
+            for display_name, email, discord_id in accounts
+        ]
+        outcomes = await self.graphql_client.execute_mutation_batch(calls, max_batch_size)
+        return [outcome if isinstance(outcome, Exception) else outcome["id"] for outcome in outcomes]
+
+    async def link_discord_ids(self, links, max_batch_size=50):
+        """Sets the discordid attribute on many existing (user_id, discord_id) accounts as batched mutations.
+
+        Returns one entry per link: the mutation result, or the exception it failed with.
+        """
+        calls = [
+            ("updateUser", {"user": {"id": user_id, "insertAttributes": [{"name": "discordid", "value": [discord_id]}]}},
+             self.UPDATE_USER_ARGUMENT_TYPES, "ok")
+            for user_id, discord_id in links
+        ]
+        return await self.graphql_client.execute_mutation_batch(calls, max_batch_size)
+
+    async def list_user_identities(self):
+        """Returns every LLDAP user as (user_id, email, discord_id) from a single bulk query."""
+        result = await self.graphql_client.execute_query("ListUsersWithAttributes")
+        return [
+            (user["id"], user["email"], self.get_attribute_value(user["attributes"], "discordid"))
+            for user in result.get("users", [])
+        ]
+
+    async def apply_group_changes(self, changes, max_batch_size=50):
+        """Applies many (action, user_id, group_id) membership changes as batched GraphQL mutations.
+
+        `action` is "add" or "remove". Returns one entry per change: the mutation result, or the exception it failed with.
+        """
+        calls = [
+            (self.GROUP_MEMBERSHIP_MUTATIONS[action], {"userId": user_id, "groupId": group_id},
+             self.GROUP_MEMBERSHIP_ARGUMENT_TYPES, "ok")
+            for action, user_id, group_id in changes
+        ]
+        return await self.graphql_client.execute_mutation_batch(calls, max_batch_size)
 
     async def get_user_by_discord_id(self, discord_id):
         """Retrieves an LLDAP user by their Discord ID."""
-        query = gql("""
-        query GetUserByDiscordId($discordid: String!) {
-            users(filters: { eq: { field: "discordid", value: $discordid } }) {
-                id
-            }
-        }
-        """)
-        result = await self.graphql_client.execute_query(query, {"discordid": discord_id})
-        return result["users"][0]["id"] if result.get("users") else None
\ No newline at end of file
+        result = await self.graphql_client.execute_query("GetUserByDiscordId", {"discordid": discord_id})
+        return result["users"][0]["id"] if result.get("users") else None
+
+    async def get_discord_id_index(self, refresh=False):
+        """Returns a Discord ID -> LLDAP user ID index built from a single bulk users query.
+
+        The index is cached for `discord_id_index_ttl` seconds; pass refresh=True to force a rebuild.
+        """
+        age = time.monotonic() - self.discord_id_index_built_at
+        if not refresh and self.discord_id_index is not None and age < self.discord_id_index_ttl:
+            return self.discord_id_index
+
+        result = await self.graphql_client.execute_query("ListUsersWithAttributes")
+
+        index = {}
+        for user in result.get("users", []):
+            discord_id = self.get_attribute_value(user["attributes"], "discordid")
+            if discord_id:
+                index[discord_id] = user["id"]
+        self.discord_id_index = index
+        self.discord_id_index_built_at = time.monotonic()
+        if self.state_store is not None:
+            self.state_store.save_discord_ids(index)
+        if self.registration_cache is not None:
+            # The same bulk query seeds the /register uniqueness checks
+            self.registration_cache.load_snapshot("email", (user.get("email") for user in result.get("users", [])))
+            self.registration_cache.load_snapshot("discord_id", index)
+        return index
+
+    async def resolve_discord_id(self, discord_id):
+        """Resolves a Discord ID to an LLDAP user ID, using the cached index before falling back to a direct lookup."""
+        index_is_fresh = (
+            self.discord_id_index is not None
+            and time.monotonic() - self.discord_id_index_built_at < self.discord_id_index_ttl
+        )
+        if index_is_fresh and discord_id in self.discord_id_index:
+            return self.discord_id_index[discord_id]
+        # Role holders without an account change roles too; don't look them up again on every event
+        if self.registration_cache is not None and self.registration_cache.lookup("discord_id", discord_id) is False:
+            return None
+        lldap_user_id = await self.get_user_by_discord_id(discord_id)
+        if self.registration_cache is not None:
+            self.registration_cache.record("discord_id", discord_id, lldap_user_id is not None)
+        if lldap_user_id and self.discord_id_index is not None:
+            self.discord_id_index[discord_id] = lldap_user_id
+        if lldap_user_id and self.state_store is not None:
+            self.state_store.set_discord_id(discord_id, lldap_user_id)
+        return lldap_user_id